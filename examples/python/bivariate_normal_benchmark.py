@@ -0,0 +1,72 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk (https://www.openriskmanagement.com), all rights reserved
+#
+# PortfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of PortfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Compare the speed and accuracy of the bivariate normal methods against a high precision
+(mpmath) reference over a grid of (a, b, rho)
+
+mpmath (installed with sympy) is optional: without it the reference is evaluated in double
+precision with scipy.integrate.quad
+
+"""
+
+import math
+import time
+
+import numpy as np
+from scipy import integrate, special
+
+from portfolioAnalytics.utils.bivariatenormal import BivariateNormalDistributionArray, BIVARIATE_NORMAL_METHODS
+
+try:
+    import mpmath
+    mpmath.mp.dps = 30
+except ImportError:
+    mpmath = None
+
+
+def reference(a, b, rho):
+    # Plackett's identity: Phi_2(a, b; rho) = Phi(a) Phi(b) + integral of the density over the correlation
+    if mpmath is None:
+        def density(r):
+            return math.exp(-(a * a - 2 * r * a * b + b * b) / (2 * (1 - r * r))) / (2 * math.pi * math.sqrt(1 - r * r))
+
+        return float(special.ndtr(a) * special.ndtr(b) + integrate.quad(density, 0, rho, epsabs=1e-15, epsrel=1e-13)[0])
+
+    a, b, rho = mpmath.mpf(a), mpmath.mpf(b), mpmath.mpf(rho)
+
+    def density(r):
+        return mpmath.exp(-(a * a - 2 * r * a * b + b * b) / (2 * (1 - r * r))) / (2 * mpmath.pi * mpmath.sqrt(1 - r * r))
+
+    return float(mpmath.ncdf(a) * mpmath.ncdf(b) + mpmath.quad(density, [0, rho]))
+
+
+# Accuracy grid
+limits = np.linspace(-4, 4, 9)
+correlations = np.array([-0.999, -0.99, -0.95, -0.8, -0.5, -0.2, 0.0, 0.2, 0.5, 0.8, 0.95, 0.99, 0.999])
+a, b, rho = [x.ravel() for x in np.meshgrid(limits, limits, correlations, indexing='ij')]
+exact = np.array([reference(*point) for point in zip(a, b, rho)])
+
+# Speed sample
+rng = np.random.default_rng(0)
+size = 200000
+sample = (rng.normal(0, 2, size), rng.normal(0, 2, size), rng.uniform(-0.999, 0.999, size))
+
+print('Method      Max Abs Error   Max Abs Error (|rho| >= 0.95)   Time per evaluation (ns)')
+for method in BIVARIATE_NORMAL_METHODS:
+    error = np.abs(BivariateNormalDistributionArray(a, b, rho, method=method) - exact)
+    start = time.perf_counter()
+    BivariateNormalDistributionArray(*sample, method=method)
+    elapsed = time.perf_counter() - start
+    print('{0:10s}  {1:.3e}       {2:.3e}                       {3:.1f}'.format(
+        method, error.max(), error[np.abs(rho) >= 0.95].max(), 1e9 * elapsed / size))
@@ -0,0 +1,101 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk (https://www.openriskmanagement.com)
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Implementing the Asymptotic Single Risk Factor (ASRF) capital formula of the Basel IRB approach.
+
+The conditional default probability is the large pool quantile of the Vasicek distribution (vasicek_lim_q).
+All calculations are vectorized over the columnar arrays of a Portfolio.
+
+See `Risk Weighted Assets <https://www.openriskmanual.org/wiki/Risk_Weighted_Asset>`_
+
+"""
+
+import numpy as np
+
+import portfolioAnalytics.vasicek as va
+
+# Basel IRB defaults for performing corporate exposures
+CONFIDENCE_LEVEL = 0.999
+PD_FLOOR = 0.0003
+DEFAULT_LGD = 0.45
+DEFAULT_MATURITY = 2.5
+
+
+def irb_correlation(p):
+    """The Basel IRB asset correlation for corporate exposures.
+
+    :param p: The probability of default
+    :return: The asset correlation
+    """
+    weight = (1.0 - np.exp(-50.0 * p)) / (1.0 - np.exp(-50.0))
+    return 0.12 * weight + 0.24 * (1.0 - weight)
+
+
+def maturity_adjustment(p, maturity):
+    """The Basel IRB maturity adjustment.
+
+    :param p: The probability of default
+    :param maturity: The effective maturity in years
+    :return: The maturity adjustment factor
+    """
+    b = np.square(0.11852 - 0.05478 * np.log(p))
+    return (1.0 + (maturity - 2.5) * b) / (1.0 - 1.5 * b)
+
+
+def asrf_capital(portfolio, alpha=CONFIDENCE_LEVEL, correlation=None, segments=None, pd_floor=PD_FLOOR):
+    """ASRF / Basel IRB capital requirement of a portfolio in one vectorized pass.
+
+    The LGD and maturity columns of the portfolio are used when present, otherwise the
+    foundation IRB defaults (DEFAULT_LGD, DEFAULT_MATURITY) apply.
+
+    :param portfolio: A Portfolio object (rating holds the PD, exposure the EAD)
+    :param alpha: The confidence level of the conditional default probability
+    :param correlation: The asset correlation (scalar or per loan array). If None the IRB corporate correlation is used
+    :param segments: Per loan segment labels for the subtotals (optional, defaults to the portfolio factor)
+    :param pd_floor: The minimum probability of default
+    :return: Dictionary with per loan arrays (conditional_pd, capital, rwa), portfolio totals and per segment subtotals
+
+    .. note:: The formula applies to performing exposures. Per loan capital is the capital requirement K times EAD.
+
+    """
+    p = np.maximum(np.asarray(portfolio.rating, dtype=float), pd_floor)
+    ead = np.asarray(portfolio.exposure, dtype=float)
+    lgd = np.asarray(portfolio.lgd, dtype=float) if len(portfolio.lgd) else DEFAULT_LGD
+    maturity = np.asarray(portfolio.maturity, dtype=float) if len(portfolio.maturity) else DEFAULT_MATURITY
+    if correlation is None:
+        correlation = irb_correlation(p)
+
+    conditional_pd = va.vasicek_lim_q(alpha, p, correlation)
+    k = lgd * (conditional_pd - p) * maturity_adjustment(p, maturity)
+    capital = k * ead
+    rwa = 12.5 * capital
+
+    if segments is None:
+        segments = portfolio.factor
+    labels, index = np.unique(np.asarray(segments), return_inverse=True)
+    segment_exposure = np.bincount(index, weights=ead, minlength=len(labels))
+    segment_capital = np.bincount(index, weights=capital, minlength=len(labels))
+    segment_rwa = np.bincount(index, weights=rwa, minlength=len(labels))
+
+    return {
+        'conditional_pd': conditional_pd,
+        'capital': capital,
+        'rwa': rwa,
+        'total_exposure': float(ead.sum()),
+        'total_capital': float(capital.sum()),
+        'total_rwa': float(rwa.sum()),
+        'segments': {label: {'exposure': float(segment_exposure[i]),
+                             'capital': float(segment_capital[i]),
+                             'rwa': float(segment_rwa[i])} for i, label in enumerate(labels.tolist())}
+    }
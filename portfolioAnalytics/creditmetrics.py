@@ -14,10 +14,14 @@
 
 
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
+import numpy as np
 from scipy import stats
 
-
+from portfolioAnalytics import settings
 from portfolioAnalytics.utils import bivariatenormal as bv
 
 """Implement Credit Metrics style variance calculations.
@@ -34,39 +38,484 @@ def Ninv(x):
     return stats.norm.ppf(x, loc=0.0, scale=1.0)
 
 
-# calculate portfolio default rate variance
+def _obligor_arrays(portfolio, correlation, loadings):
+    """Per obligor and per factor pair quantities of the variance calculation.
 
+    :return: Tuple of (PD, exposure, factor index, default threshold, factor pair asset correlation) arrays
+    """
+    p = np.asarray(portfolio.rating, dtype=float)
+    exposure = np.asarray(portfolio.exposure, dtype=float)
+    factor = np.asarray(portfolio.factor, dtype=int)
+    loadings = np.asarray(loadings, dtype=float)
+    factor_rho = np.outer(loadings, loadings) * np.asarray(correlation, dtype=float)
+    return p, exposure, factor, Ninv(p), factor_rho
 
-def variance(portfolio, correlation, loadings):
-    """Variance calculation.
 
+def _pair_blocks(n, block_size=None, start=0, stop=None):
+    """Generate the index pairs (i, j) with j < i in row blocks of at most block_size pairs.
 
+    :param n: The number of obligors
+    :param block_size: The maximum number of pairs per block (default settings.BLOCK_SIZE)
+    :param start: The first row
+    :param stop: The last row (exclusive, default n)
     """
-    n = portfolio.psize
-    variance_sum = 0.0
-    name_var = 0.0
+    block_size = settings.BLOCK_SIZE if block_size is None else block_size
+    stop = n if stop is None else stop
+    # a block of rows i in [row, last) holds at most (last - row) * n pairs
+    rows = max(1, block_size // max(n, 1))
+    for row in range(start, stop, rows):
+        last = min(stop, row + rows)
+        i, j = np.nonzero(np.arange(last)[np.newaxis, :] < np.arange(row, last)[:, np.newaxis])
+        yield i + row, j
+
+
+def _pair_covariance(i, j, p, exposure, factor, a, factor_rho):
+    """Exposure weighted default covariance of the obligor pairs (i, j)."""
+    rho = factor_rho[factor[i], factor[j]]
+    return exposure[i] * exposure[j] * (bv.BivariateNormalDistributionArray(a[i], a[j], rho) - p[i] * p[j])
+
+
+def _buckets(p, factor):
+    """Group obligors into buckets of identical (PD, factor).
+
+    :return: Tuple of (bucket PD, bucket factor, bucket index of each obligor)
+    """
+    keys, index = np.unique(np.column_stack([p, factor]), axis=0, return_inverse=True)
+    return keys[:, 0], keys[:, 1].astype(int), index.ravel()
+
+
+def _bucket_covariance(p, factor, factor_rho):
+    """Default covariance matrix between buckets of identical (PD, factor)."""
+    a = Ninv(p)
+    rho = factor_rho[factor[:, np.newaxis], factor[np.newaxis, :]]
+    return bv.BivariateNormalDistributionArray(a[:, np.newaxis], a[np.newaxis, :], rho) - np.outer(p, p)
 
+
+def _variance_pairwise(p, exposure, factor, a, factor_rho):
+    """Variance as a sum over all obligor pairs (row blocks of pairs)."""
     # Portfolio Variance du to correlation
-    for i in range(n):
-        for j in range(i):
-            p1 = portfolio.rating[i]
-            p2 = portfolio.rating[j]
-            a1 = Ninv(p1)
-            a2 = Ninv(p2)
-            Omega = correlation[portfolio.factor[i], portfolio.factor[j]]
-            rho = loadings[portfolio.factor[i]] * loadings[portfolio.factor[j]] * Omega
-            variance_pair = portfolio.exposure[i] * portfolio.exposure[j] * (
-                    bv.BivariateNormalDistribution(a1, a2, rho) - p1 * p2)
-            variance_sum += variance_pair
+    variance_sum = 0.0
+    for i, j in _pair_blocks(len(p)):
+        variance_sum += np.sum(_pair_covariance(i, j, p, exposure, factor, a, factor_rho))
 
     # Idiosyncratic Portfolio Variance due to name concentration
-    for i in range(n - 1):
-        p1 = portfolio.rating[i]
-        name_var += portfolio.exposure[i] * portfolio.exposure[i] * (p1 - p1 * p1)
+    name_var = np.sum(exposure * exposure * (p - p * p))
+
+    return 2 * variance_sum + name_var
+
+
+def _variance_bucketed(p, exposure, factor, a, factor_rho):
+    """Variance as a sum over pairs of (PD, factor) buckets.
+
+    With bucket exposure sums S and squared exposure sums Q, the pair sum over distinct obligors is
+    S' C S - sum_g Q_g C_gg, which is exact.
+    """
+    bucket_p, bucket_factor, index = _buckets(p, factor)
+    covariance = _bucket_covariance(bucket_p, bucket_factor, factor_rho)
+    s = np.bincount(index, weights=exposure, minlength=len(bucket_p))
+    q = np.bincount(index, weights=exposure * exposure, minlength=len(bucket_p))
+    return s.dot(covariance).dot(s) + np.sum(q * (bucket_p - bucket_p * bucket_p - np.diag(covariance)))
+
+
+# Obligor arrays of the blocked variance workers (attached to the shared memory block)
+_SHARED = {}
+
+
+def _attach_shared(name, n, factor_rho):
+    """Worker initializer: map the obligor arrays of the shared memory block without copying."""
+    block = shared_memory.SharedMemory(name=name)
+    arrays = np.ndarray((4, n), dtype=float, buffer=block.buf)
+    _SHARED.update(block=block, p=arrays[0], exposure=arrays[1], factor=arrays[2].astype(int), a=arrays[3],
+                   factor_rho=factor_rho)
+
+
+def _variance_tile(start, stop):
+    """Pair sum of the rows [start, stop) of the shared obligor arrays (worker task)."""
+    p, exposure, factor, a = _SHARED['p'], _SHARED['exposure'], _SHARED['factor'], _SHARED['a']
+    result = 0.0
+    for i, j in _pair_blocks(len(p), start=start, stop=stop):
+        result += np.sum(_pair_covariance(i, j, p, exposure, factor, a, _SHARED['factor_rho']))
+    return result
+
+
+def _row_tiles(n, tiles):
+    """Row boundaries splitting the lower triangle of pairs into tiles with similar numbers of pairs."""
+    # rows [0, r) hold about r^2 / 2 pairs
+    bounds = np.unique(np.rint(n * np.sqrt(np.arange(tiles + 1) / tiles)).astype(int))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _variance_blocked(p, exposure, factor, a, factor_rho, workers=None):
+    """Variance as a sum over tiles of rows of pairs, evaluated by a process pool.
+
+    The obligor arrays are placed once in a shared memory block that the workers map directly, and
+    each worker holds at most BLOCK_SIZE pairs at a time, so that peak memory does not grow with the
+    number of pairs.
+    """
+    n = len(p)
+    workers = os.cpu_count() if workers is None else workers
+    name_var = np.sum(exposure * exposure * (p - p * p))
+    if n < 2:
+        return name_var
+    # enough tiles to balance the load and keep each tile within a few pair blocks
+    tiles = max(4 * workers, n * (n - 1) // (2 * settings.BLOCK_SIZE) + 1)
+    start, stop = zip(*_row_tiles(n, min(tiles, n)))
+
+    block = shared_memory.SharedMemory(create=True, size=4 * n * np.dtype(float).itemsize)
+    try:
+        arrays = np.ndarray((4, n), dtype=float, buffer=block.buf)
+        arrays[:] = [p, exposure, factor, a]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared,
+                                 initargs=(block.name, n, factor_rho)) as executor:
+            variance_sum = sum(executor.map(_variance_tile, start, stop))
+        del arrays
+    finally:
+        block.close()
+        block.unlink()
 
     return 2 * variance_sum + name_var
 
 
+# Cramer's bound |He_k(x)| exp(-x^2 / 4) <= CRAMER_BOUND sqrt(k!) on the Hermite polynomials
+CRAMER_BOUND = 1.086435
+
+
+def _variance_hermite(p, exposure, factor, a, factor_rho, order=None):
+    """Variance from the tetrachoric (Hermite) expansion of the bivariate normal, truncated at order m.
+
+    Phi2(a_i, a_j; rho) - p_i p_j = phi(a_i) phi(a_j) sum_k rho^k / k! He_{k-1}(a_i) He_{k-1}(a_j) and
+    rho_ij is a function of the factor pair only, so that the pair sum of each order reduces to a
+    quadratic form in the per factor sums of E_i phi(a_i) He_{k-1}(a_i) / sqrt(k!), O(n m + F^2 m).
+
+    The error bound follows from Cramer's inequality on the Hermite polynomials:
+    |truncation error| <= K^2 / (2 pi (m + 1)) sum_fg W_f W_g |rho_fg|^(m+1) / (1 - |rho_fg|)
+    with W_f the factor sums of E_i exp(-a_i^2 / 4).
+
+    :return: Tuple of (variance, truncation error bound)
+    """
+    order = settings.TETRACHORIC_ORDER if order is None else order
+    factors = len(factor_rho)
+    density = np.exp(-0.5 * a * a) / math.sqrt(2.0 * math.pi)
+    # normalized Hermite polynomials h_k = He_k / sqrt(k!) by recurrence
+    h_previous, h = np.zeros_like(a), np.ones_like(a)
+    rho_power = np.ones_like(factor_rho)
+    diagonal = np.diag(factor_rho)[factor]
+    variance_sum = 0.0
+    for k in range(1, order + 1):
+        rho_power = rho_power * factor_rho
+        u = exposure * density * h / math.sqrt(k)
+        s = np.bincount(factor, weights=u, minlength=factors)
+        variance_sum += s.dot(rho_power).dot(s) - np.sum(u * u * diagonal ** k)
+        h_previous, h = h, (a * h - math.sqrt(k - 1) * h_previous) / math.sqrt(k)
+
+    w = np.bincount(factor, weights=np.abs(exposure) * np.exp(-0.25 * a * a), minlength=factors)
+    rho = np.abs(factor_rho)
+    error = CRAMER_BOUND ** 2 / (2.0 * math.pi * (order + 1)) * w.dot(rho ** (order + 1) / (1.0 - rho)).dot(w)
+
+    name_var = np.sum(exposure * exposure * (p - p * p))
+    return variance_sum + name_var, float(error)
+
+
+def _variance_truncated(p, exposure, factor, a, factor_rho, tolerance=None):
+    """Variance over the obligor pairs whose contribution can exceed the tolerance.
+
+    The pair covariance is bounded by |E_i E_j cov_ij| <= w_i w_j with either (Cauchy-Schwarz)
+    w_i = |E_i| sqrt(p_i (1 - p_i)) or, with r the largest absolute asset correlation, (bounding
+    the bivariate normal density between zero and r) w_i = |E_i| exp(-a_i^2 / (2 (1 + r))) sqrt(r / (2 pi sqrt(1 - r^2))),
+    whichever has the smaller total. With the obligors sorted by decreasing w the retained partners
+    of each obligor form a prefix, so that the retained pairs are generated directly and the bound
+    on the omitted pairs follows from prefix sums of w.
+
+    :return: Tuple of (variance, bound on the omitted pair contributions)
+    """
+    tolerance = settings.PRECISION if tolerance is None else tolerance
+    w = np.abs(exposure) * np.sqrt(p - p * p)
+    used = np.unique(factor)
+    r = np.max(np.abs(factor_rho[np.ix_(used, used)])) if len(used) else 0.0
+    if r < 1.0:
+        density = np.abs(exposure) * np.exp(-0.5 * a * a / (1.0 + r)) * math.sqrt(r / (2.0 * math.pi * math.sqrt(1.0 - r * r)))
+        if np.sum(density) < np.sum(w):
+            w = density
+    order = np.argsort(-w, kind='stable')
+    ws = w[order]
+    # number of obligors with w_j >= tolerance / w_i (the prefix of retained partners of i)
+    with np.errstate(divide='ignore'):
+        limit = np.searchsorted(-ws, -tolerance / ws, side='right')
+    lengths = np.minimum(np.arange(len(ws)), limit)
+    prefix = np.concatenate([[0.0], np.cumsum(ws)])
+
+    variance_sum = 0.0
+    ends = np.cumsum(lengths)
+    row = 0
+    while row < len(ws):
+        # rows [row, last) hold at most BLOCK_SIZE pairs (or a single row)
+        last = max(row + 1, int(np.searchsorted(ends, ends[row] - lengths[row] + settings.BLOCK_SIZE, side='right')))
+        block = lengths[row:last]
+        i = np.repeat(np.arange(row, last), block)
+        j = np.arange(len(i)) - np.repeat(np.cumsum(block) - block, block)
+        variance_sum += np.sum(_pair_covariance(order[i], order[j], p, exposure, factor, a, factor_rho))
+        row = last
+
+    total = 0.5 * (prefix[-1] ** 2 - np.sum(ws * ws))
+    retained = np.dot(ws, prefix[lengths])
+    error = 2.0 * max(total - retained, 0.0)
+
+    name_var = np.sum(exposure * exposure * (p - p * p))
+    return 2 * variance_sum + name_var, float(error)
+
+
+def _covariance_rows_pairwise(p, exposure, factor, a, factor_rho):
+    """Exposure weighted default covariance of each obligor with all other obligors (row blocks of pairs)."""
+    n = len(p)
+    row = np.zeros(n)
+    for i, j in _pair_blocks(n):
+        c = bv.BivariateNormalDistributionArray(a[i], a[j], factor_rho[factor[i], factor[j]]) - p[i] * p[j]
+        row += np.bincount(i, weights=exposure[j] * c, minlength=n)
+        row += np.bincount(j, weights=exposure[i] * c, minlength=n)
+    return row
+
+
+def _covariance_rows_bucketed(p, exposure, factor, a, factor_rho):
+    """Exposure weighted default covariance of each obligor with all other obligors (bucket exposure sums)."""
+    bucket_p, bucket_factor, index = _buckets(p, factor)
+    covariance = _bucket_covariance(bucket_p, bucket_factor, factor_rho)
+    s = np.bincount(index, weights=exposure, minlength=len(bucket_p))
+    return covariance.dot(s)[index] - np.diag(covariance)[index] * exposure
+
+
+COVARIANCE_ROW_METHODS = {
+    'Pairwise': _covariance_rows_pairwise,
+    'Bucketed': _covariance_rows_bucketed,
+}
+
+
+VARIANCE_METHODS = {
+    'Pairwise': _variance_pairwise,
+    'Bucketed': _variance_bucketed,
+    'Blocked': _variance_blocked,
+    'Hermite': _variance_hermite,
+    'Truncated': _variance_truncated,
+}
+
+
+def variance(portfolio, correlation, loadings, method='Pairwise', workers=None, order=None, tolerance=None,
+             full_output=False):
+    """Variance calculation.
+
+    The default thresholds are computed once per obligor and the asset correlations once per
+    factor pair. The available methods are
+
+    * Pairwise: the pair terms are evaluated as arrays over row blocks of at most BLOCK_SIZE pairs, O(n^2)
+    * Bucketed: obligors are grouped into B buckets of identical (PD, factor) and the exact variance is computed from bucket exposure sums, O(n + B^2)
+    * Blocked: the pair space is split into tiles of rows that are evaluated by a process pool reading the obligor arrays from shared memory, O(n^2 / workers)
+    * Hermite: approximation by the tetrachoric series of the bivariate normal truncated at the given order m, O(n m + F^2 m) for F factors
+    * Truncated: the pairs whose contribution is bounded by less than the tolerance are omitted, the error bound is the sum of the omitted bounds, O(retained pairs + n log n)
+
+    :param portfolio: A Portfolio object
+    :param correlation: The factor correlation matrix
+    :param loadings: The factor loadings
+    :param method: The calculation method (Pairwise, Bucketed, Blocked, Hermite, Truncated)
+    :param workers: The number of worker processes of the Blocked method (default the number of CPUs)
+    :param order: The truncation order of the Hermite method (default settings.TETRACHORIC_ORDER)
+    :param tolerance: The pair contribution threshold of the Truncated method (default settings.PRECISION)
+    :param full_output: If True also return the error bound (zero for the exact methods)
+    :return: The portfolio loss variance
+
+    .. note:: When the portfolio has obligor identifiers the facilities are first netted to obligors (Portfolio.netted), so that the facilities of an obligor default together.
+
+    """
+    if method not in VARIANCE_METHODS:
+        raise ValueError('Unknown variance method: ' + str(method))
+    arrays = _obligor_arrays(portfolio.netted(), correlation, loadings)
+    if method == 'Hermite':
+        result, error = _variance_hermite(*arrays, order=order)
+    elif method == 'Truncated':
+        result, error = _variance_truncated(*arrays, tolerance=tolerance)
+    elif method == 'Blocked':
+        result, error = _variance_blocked(*arrays, workers=workers), 0.0
+    else:
+        result, error = VARIANCE_METHODS[method](*arrays), 0.0
+    if full_output:
+        return result, error
+    return result
+
+
+def risk_contributions(portfolio, correlation, loadings, method='Pairwise'):
+    """Euler allocation of the Credit Metrics Loss Volatility to obligors, factors and rating grades.
+
+    The marginal contribution of obligor i is the derivative of the loss volatility with respect to
+    its exposure, sum_j cov_ij E_j / sigma, and its Euler (risk) contribution is E_i times the
+    marginal contribution. The risk contributions add up to the loss volatility. All quantities are
+    obtained from a single pass over the obligor pairs (or buckets).
+
+    :param portfolio: A Portfolio object
+    :param correlation: The factor correlation matrix
+    :param loadings: The factor loadings
+    :param method: The calculation method (Pairwise, Bucketed)
+    :return: Dictionary with the variance, the loss volatility (ul), per obligor arrays (marginal, contributions, in the order of Portfolio.netted when obligor identifiers are present) and the per factor and per rating (PD) subtotals of the contributions
+
+    """
+    if method not in COVARIANCE_ROW_METHODS:
+        raise ValueError('Unknown variance method: ' + str(method))
+    p, exposure, factor, a, factor_rho = _obligor_arrays(portfolio.netted(), correlation, loadings)
+    row = COVARIANCE_ROW_METHODS[method](p, exposure, factor, a, factor_rho) + exposure * (p - p * p)
+    result = float(np.dot(exposure, row))
+    ul = math.sqrt(result)
+    marginal = row / ul if ul > 0 else np.zeros_like(row)
+    contributions = exposure * marginal
+
+    factors, factor_index = np.unique(factor, return_inverse=True)
+    factor_contributions = np.bincount(factor_index.ravel(), weights=contributions, minlength=len(factors))
+    ratings, rating_index = np.unique(p, return_inverse=True)
+    rating_contributions = np.bincount(rating_index.ravel(), weights=contributions, minlength=len(ratings))
+
+    return {
+        'variance': result,
+        'ul': ul,
+        'marginal': marginal,
+        'contributions': contributions,
+        'factors': {label: float(factor_contributions[i]) for i, label in enumerate(factors.tolist())},
+        'ratings': {label: float(rating_contributions[i]) for i, label in enumerate(ratings.tolist())},
+    }
+
+
+class VarianceAccumulator(object):
+    """ The _`VarianceAccumulator` object maintains the Credit Metrics variance of a portfolio under changes.
+
+    Obligors can be added, removed or have their exposure amended without recomputing the
+    variance from scratch. With the Pairwise method each obligor keeps its aggregate covariance
+    row (sum over the other obligors of exposure times default covariance), so that each change
+    costs O(n) bivariate normal evaluations. With the Bucketed method the state consists of
+    (PD, factor) bucket exposure sums and each change costs O(B).
+
+    Obligors are identified by the integer index returned by add (the initial portfolio
+    obligors have the indices 0, ..., n - 1).
+
+    """
+
+    def __init__(self, portfolio, correlation, loadings, method='Pairwise'):
+        """Initialize the accumulator with a portfolio (an O(n^2) or O(n + B^2) calculation).
+
+        :param portfolio: A Portfolio object
+        :param correlation: The factor correlation matrix
+        :param loadings: The factor loadings
+        :param method: The calculation method (Pairwise, Bucketed)
+        """
+        if method not in ('Pairwise', 'Bucketed'):
+            raise ValueError('Unknown variance method: ' + str(method))
+        self.method = method
+        p, exposure, factor, a, self.factor_rho = _obligor_arrays(portfolio, correlation, loadings)
+        self.size = len(p)
+        self.active = np.ones(self.size, dtype=bool)
+        # private copies, the portfolio data is not modified
+        self.p = p.copy()
+        self.exposure = exposure.copy()
+        self.factor = factor.copy()
+        if method == 'Pairwise':
+            self.a = a
+            self.row = _covariance_rows_pairwise(p, exposure, factor, a, self.factor_rho)
+        else:
+            bucket_p, bucket_factor, self.bucket = _buckets(p, factor)
+            self.bucket_index = {(pd, f): g for g, (pd, f) in enumerate(zip(bucket_p.tolist(), bucket_factor.tolist()))}
+            self.bucket_p = bucket_p
+            self.bucket_factor = bucket_factor
+            self.covariance = _bucket_covariance(bucket_p, bucket_factor, self.factor_rho)
+            self.s = np.bincount(self.bucket, weights=exposure, minlength=len(bucket_p))
+            self.q = np.bincount(self.bucket, weights=exposure * exposure, minlength=len(bucket_p))
+
+    def _obligor_covariance(self, k, p, a, factor):
+        """Default covariance of an obligor (PD p, threshold a, factor) with all active obligors except k."""
+        n = self.size
+        c = bv.BivariateNormalDistributionArray(a, self.a[:n], self.factor_rho[factor, self.factor[:n]]) - p * self.p[:n]
+        c[~self.active[:n]] = 0.0
+        c[k] = 0.0
+        return c
+
+    def _grow(self):
+        """Append an empty obligor slot (doubling the array capacity when needed)."""
+        names = ['p', 'exposure', 'factor', 'active'] + (['a', 'row'] if self.method == 'Pairwise' else ['bucket'])
+        if self.size == len(self.p):
+            for name in names:
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros(max(len(array), 1), dtype=array.dtype)]))
+        self.size += 1
+        return self.size - 1
+
+    def _bucket_of(self, p, factor):
+        """The bucket index of (PD, factor), creating the bucket (O(B)) if needed."""
+        key = (float(p), int(factor))
+        if key not in self.bucket_index:
+            p_all = np.append(self.bucket_p, key[0])
+            factor_all = np.append(self.bucket_factor, key[1])
+            a = Ninv(p_all)
+            c = bv.BivariateNormalDistributionArray(a[-1], a, self.factor_rho[key[1], factor_all]) - key[0] * p_all
+            self.covariance = np.block([[self.covariance, c[:-1, np.newaxis]], [c[np.newaxis, :]]])
+            self.bucket_p, self.bucket_factor = p_all, factor_all
+            self.s, self.q = np.append(self.s, 0.0), np.append(self.q, 0.0)
+            self.bucket_index[key] = len(p_all) - 1
+        return self.bucket_index[key]
+
+    def add(self, p, exposure, factor):
+        """Add an obligor.
+
+        :param p: The probability of default
+        :param exposure: The exposure
+        :param factor: The factor index
+        :return: The obligor index
+        """
+        k = self._grow()
+        self.p[k], self.exposure[k], self.factor[k], self.active[k] = p, 0.0, factor, True
+        if self.method == 'Pairwise':
+            self.a[k] = Ninv(p)
+            c = self._obligor_covariance(k, self.p[k], self.a[k], self.factor[k])
+            self.row[k] = np.dot(self.exposure[:self.size], c)
+            self.row[:self.size] += exposure * c
+            self.exposure[k] = exposure
+        else:
+            self.bucket[k] = self._bucket_of(p, factor)
+            self.update_exposure(k, exposure)
+        return k
+
+    def remove(self, k):
+        """Remove an obligor.
+
+        :param k: The obligor index
+        """
+        self.update_exposure(k, 0.0)
+        self.active[k] = False
+
+    def update_exposure(self, k, exposure):
+        """Change the exposure of an obligor.
+
+        :param k: The obligor index
+        :param exposure: The new exposure
+        """
+        if not self.active[k]:
+            raise ValueError('Inactive obligor: ' + str(k))
+        delta = exposure - self.exposure[k]
+        if self.method == 'Pairwise':
+            c = self._obligor_covariance(k, self.p[k], self.a[k], self.factor[k])
+            self.row[:self.size] += delta * c
+        else:
+            g = self.bucket[k]
+            self.s[g] += delta
+            self.q[g] += exposure * exposure - self.exposure[k] * self.exposure[k]
+        self.exposure[k] = exposure
+
+    def variance(self):
+        """The current portfolio loss variance."""
+        if self.method == 'Pairwise':
+            active = self.active[:self.size]
+            p, exposure = self.p[:self.size][active], self.exposure[:self.size][active]
+            return np.sum(exposure * exposure * (p - p * p)) + np.dot(exposure, self.row[:self.size][active])
+        return self.s.dot(self.covariance).dot(self.s) + np.sum(
+            self.q * (self.bucket_p - self.bucket_p * self.bucket_p - np.diag(self.covariance)))
+
+    def creditmetrics_ul(self):
+        """The current Credit Metrics Loss Volatility (Standard Deviation of Loss)."""
+        return math.sqrt(self.variance())
+
+
 def creditmetrics_el(portfolio, correlation, loadings):
     """Credit Metrics Expected Loss Calculation.
 
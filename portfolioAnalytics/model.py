@@ -16,6 +16,7 @@
 
 import json
 
+import portfolioAnalytics.montecarlo as mc
 import portfolioAnalytics.vasicek as va
 
 
@@ -48,11 +49,30 @@ class LossDistribution(object):
         self.mean = []
         self.stddev = []
         self.quantiles = {}
+        self.shortfall = {}
+        self.sketches = []
 
-    def calculate(self, method=None, periods=None, portfolio=None, asset_correlation=None, scenario=None):
+    def calculate(self, method=None, periods=None, portfolio=None, asset_correlation=None, scenario=None,
+                  correlation=None, loadings=None, scenarios=None, confidence=mc.CONFIDENCE_LEVELS, seed=None,
+                  importance=None, sampling='Pseudo', workers=None):
         """Calculate a loss distribution given a method, a portfolio and (optionally) a scenario.
 
-        .. note::
+        The available methods are
+
+        * Finite_Vasicek: the portfolio is reduced to the number of obligors and the average PD
+        * MonteCarlo: simulation of the multi-factor Gaussian copula with the factor correlation matrix and loadings of the Credit Metrics variance (see montecarlo.loss_statistics). The VaR and expected shortfall per confidence level are stored in quantiles and shortfall, the quantile sketch of the simulated losses (constant memory in the number of scenarios) in sketches
+
+        :param method: The calculation method (Finite_Vasicek, MonteCarlo)
+        :param portfolio: A Portfolio object
+        :param asset_correlation: The asset correlation (Finite_Vasicek)
+        :param correlation: The factor correlation matrix (MonteCarlo)
+        :param loadings: The factor loadings (MonteCarlo)
+        :param scenarios: The number of scenarios (MonteCarlo)
+        :param confidence: The confidence levels of the VaR and expected shortfall (MonteCarlo)
+        :param seed: The random number seed (MonteCarlo)
+        :param importance: The importance sampling mode of the tail (None, Shift, Twist) (MonteCarlo)
+        :param sampling: The sampling of the systematic factors (Pseudo, Sobol) (MonteCarlo)
+        :param workers: The number of worker processes (MonteCarlo)
 
         """
         # Calculate moments for all periods
@@ -64,6 +84,25 @@ class LossDistribution(object):
                 N, p = portfolio.preprocess_portfolio()
                 self.mean.append(va.vasicek_base_el(N, p, asset_correlation))
                 self.stddev.append(va.vasicek_base_ul(N, p, asset_correlation))
+            elif method == 'MonteCarlo':
+                result = mc.loss_statistics(portfolio, correlation, loadings, scenarios=scenarios,
+                                            confidence=confidence, seed=seed, importance=importance,
+                                            sampling=sampling, workers=workers)
+                self.mean.append(result['mean'])
+                self.stddev.append(result['ul'])
+                for alpha in confidence:
+                    self.quantiles.setdefault(alpha, []).append(result['var'][alpha])
+                    self.shortfall.setdefault(alpha, []).append(result['es'][alpha])
+                self.sketches.append(result['sketch'])
+
+    def quantile(self, alpha, period=0):
+        """The loss quantile at any confidence level from the quantile sketch of a Monte Carlo calculation.
+
+        :param alpha: The confidence level
+        :param period: The period
+        :return: The loss quantile (within the relative accuracy of the sketch)
+        """
+        return self.sketches[period].quantile(alpha)
 
     def to_json(self, json_file=None, accuracy=5):
         """Serialize to JSON.
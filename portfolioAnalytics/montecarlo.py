@@ -0,0 +1,526 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk (https://www.openriskmanagement.com)
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Monte Carlo simulation of the portfolio loss in the multi-factor Gaussian copula model.
+
+The model is the one of the Credit Metrics variance calculation: the asset value of obligor i is
+X_i = l_f Y_f + sqrt(1 - l_f^2) e_i, where f is the factor of the obligor, l_f the factor loading,
+Y the systematic factors with correlation matrix Omega and e_i independent standard normal shocks.
+The obligor defaults when X_i < Ninv(p_i).
+
+* simulate_losses_ generates the portfolio losses in batches of scenarios
+* loss_statistics_ estimates the mean, loss volatility, VaR and expected shortfall (optionally with importance sampling)
+* importance_shift_ computes the systematic factor mean shift of the importance sampling
+* LossMoments_ accumulates (and merges) the moments of the loss batches
+* LossSummary_ accumulates (and merges) the moments and a quantile sketch of the losses, the compact result of a simulation worker
+
+The systematic factors are drawn pseudo-randomly or from scrambled Sobol sequences (randomized
+quasi-Monte Carlo), the idiosyncratic shocks are always pseudo-random.
+
+"""
+
+import math
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import optimize, stats
+from scipy.stats import qmc
+
+from portfolioAnalytics import creditmetrics, settings
+from portfolioAnalytics.utils.portfolio import Portfolio
+from portfolioAnalytics.utils.sketch import QuantileSketch
+
+# Default confidence levels of the loss quantiles
+CONFIDENCE_LEVELS = (0.99, 0.999)
+
+# Importance sampling modes: factor mean shift, factor mean shift and conditional PD twist (Glasserman-Li)
+IMPORTANCE_METHODS = ('Shift', 'Twist')
+
+# Sampling of the systematic factors: pseudo-random or randomized quasi-Monte Carlo (scrambled Sobol)
+SAMPLING_METHODS = ('Pseudo', 'Sobol')
+
+
+def _simulation_arrays(portfolio, correlation, loadings):
+    """Per obligor quantities of the simulation (facilities are netted to obligors, see Portfolio.netted).
+
+    :return: Tuple of (default threshold, loss given default amount, factor index, factor loading, Cholesky factor of the factor correlation)
+    """
+    portfolio = portfolio.netted()
+    p = np.asarray(portfolio.rating, dtype=float)
+    exposure = np.asarray(portfolio.exposure, dtype=float)
+    if len(portfolio.lgd):
+        exposure = exposure * np.asarray(portfolio.lgd, dtype=float)
+    factor = np.asarray(portfolio.factor, dtype=int)
+    loadings = np.asarray(loadings, dtype=float)
+    cholesky = np.linalg.cholesky(np.atleast_2d(np.asarray(correlation, dtype=float)))
+    return stats.norm.ppf(p), exposure, factor, loadings[factor], cholesky
+
+
+def _batch_sizes(scenarios, batch_size):
+    """Split the number of scenarios into batches of at most batch_size."""
+    for start in range(0, scenarios, batch_size):
+        yield min(batch_size, scenarios - start)
+
+
+def _conditional_pd(z, a, factor, loading, cholesky):
+    """Conditional default probabilities given independent standard normal factor draws z (scenarios x F)."""
+    y = np.atleast_2d(z).dot(cholesky.T)
+    return stats.norm.cdf((a - y[:, factor] * loading) / np.sqrt(1.0 - loading * loading))
+
+
+def _twist_parameter(pz, loss, threshold, iterations=50):
+    """Solve psi'(theta) = threshold (per scenario) for the conditional cumulant generating function psi.
+
+    psi(theta) = sum_i log(1 + p_i (exp(theta c_i) - 1)) is convex, so its derivative is increasing.
+    The root is found by Newton iterations safeguarded by bisection; theta is zero when the
+    conditional expected loss already exceeds the threshold.
+    """
+    theta = np.zeros(len(pz))
+    lower = np.zeros(len(pz))
+    upper = np.full(len(pz), np.inf)
+    for _ in range(iterations):
+        e = np.exp(np.minimum(np.outer(theta, loss), 700.0))
+        q = pz * e / (1.0 + pz * (e - 1.0))
+        derivative = q.dot(loss) - threshold
+        curvature = (q * (1.0 - q)).dot(loss * loss)
+        lower = np.where(derivative < 0, theta, lower)
+        upper = np.where(derivative > 0, theta, upper)
+        with np.errstate(divide='ignore', over='ignore'):
+            step = theta - derivative / curvature
+        bisection = np.where(np.isinf(upper), 2.0 * lower + 1.0 / np.max(np.abs(loss)), 0.5 * (lower + upper))
+        update = np.where((step > lower) & (step < upper), step, bisection)
+        if np.all(np.abs(update - theta) <= 1e-12 * np.maximum(1.0, np.abs(theta))):
+            theta = update
+            break
+        theta = update
+    return np.where(pz.dot(loss) >= threshold, 0.0, theta)
+
+
+def _conditional_cgf(theta, pz, loss):
+    """The conditional cumulant generating function psi(theta) of the loss (per scenario)."""
+    return np.sum(np.log1p(pz * np.expm1(np.minimum(np.outer(theta, loss), 700.0))), axis=1)
+
+
+def _default_threshold(a, loss, factor, loading, cholesky, alpha):
+    """Loss threshold of the importance sampling: the conditional expected loss at the alpha quantile of the
+    factor direction in which the conditional expected loss increases fastest."""
+    step = 1e-6
+    base = _conditional_pd(np.zeros(len(cholesky)), a, factor, loading, cholesky).dot(loss)[0]
+    gradient = np.array([(_conditional_pd(step * e, a, factor, loading, cholesky).dot(loss)[0] - base) / step
+                         for e in np.eye(len(cholesky))])
+    direction = gradient / np.linalg.norm(gradient)
+    return float(_conditional_pd(stats.norm.ppf(alpha) * direction, a, factor, loading, cholesky).dot(loss)[0])
+
+
+def importance_shift(portfolio, correlation, loadings, threshold=None, alpha=max(CONFIDENCE_LEVELS)):
+    """The systematic factor mean shift of the importance sampling (Glasserman-Li).
+
+    The shift maximizes the tail bound approximation -theta x + psi(theta, z) - z.z / 2 of the
+    log density of the factor scenarios z (independent standard normal coordinates) that lead to
+    a loss above the threshold x.
+
+    :param portfolio: A Portfolio object
+    :param correlation: The factor correlation matrix
+    :param loadings: The factor loadings
+    :param threshold: The loss threshold (default the conditional expected loss at the alpha quantile of the worst factor direction)
+    :param alpha: The confidence level of the default threshold
+    :return: Tuple of (factor mean shift, loss threshold)
+    """
+    a, loss, factor, loading, cholesky = _simulation_arrays(portfolio, correlation, loadings)
+    return _importance_shift(a, loss, factor, loading, cholesky, threshold, alpha)
+
+
+def _importance_shift(a, loss, factor, loading, cholesky, threshold, alpha):
+    """The factor mean shift and loss threshold from the simulation arrays."""
+    if threshold is None:
+        threshold = _default_threshold(a, loss, factor, loading, cholesky, alpha)
+
+    def objective(z):
+        pz = _conditional_pd(z, a, factor, loading, cholesky)
+        theta = _twist_parameter(pz, loss, threshold)
+        return -(_conditional_cgf(theta, pz, loss)[0] - theta[0] * threshold - 0.5 * np.dot(z, z))
+
+    start = stats.norm.ppf(alpha) * np.ones(len(cholesky)) / math.sqrt(len(cholesky))
+    # start in the direction of increasing losses
+    if objective(start) > objective(-start):
+        start = -start
+    result = optimize.minimize(objective, start, method='Nelder-Mead' if len(cholesky) == 1 else 'BFGS')
+    return result.x, threshold
+
+
+def _sobol_draws(dimension, rng, start=0):
+    """Standard normal factor draws from a scrambled Sobol sequence (randomized by rng), from point start on."""
+    engine = qmc.Sobol(d=dimension, scramble=True, seed=rng)
+    if start > 0:
+        engine.fast_forward(int(start))
+    tiny = np.finfo(float).tiny
+
+    def draws(size):
+        # the batches and worker chunks together make up the 2^m points of the randomization
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            points = engine.random(size)
+        return stats.norm.ppf(np.clip(points, tiny, 1.0 - np.finfo(float).epsneg))
+    return draws
+
+
+def _loss_batches(arrays, scenarios, batch_size, rng, shift=None, threshold=None, factor_draws=None):
+    """Generate batches of (losses, likelihood ratio weights).
+
+    The factor draws (independent standard normal coordinates) are taken from factor_draws(size)
+    when given, otherwise from rng.
+
+    Without a shift the weights are None. With a factor mean shift the factor scenarios are drawn
+    around the shift and weighted by exp(-shift.z + shift.shift / 2). With a threshold the
+    conditional default probabilities are also exponentially twisted (Glasserman-Li) and the
+    defaults are drawn from the twisted probabilities with weights exp(-theta L + psi(theta)).
+    """
+    a, loss, factor, loading, cholesky = arrays
+    idiosyncratic = np.sqrt(1.0 - loading * loading)
+    if factor_draws is None:
+        def factor_draws(size):
+            return rng.standard_normal((size, len(cholesky)))
+    for size in _batch_sizes(scenarios, batch_size):
+        z = factor_draws(size)
+        if shift is None:
+            x = z.dot(cholesky.T)[:, factor] * loading + rng.standard_normal((size, len(a))) * idiosyncratic
+            yield (x < a).astype(float).dot(loss), None
+            continue
+        z = z + shift
+        log_weight = - z.dot(shift) + 0.5 * np.dot(shift, shift)
+        if threshold is None:
+            x = z.dot(cholesky.T)[:, factor] * loading + rng.standard_normal((size, len(a))) * idiosyncratic
+            losses = (x < a).astype(float).dot(loss)
+        else:
+            pz = _conditional_pd(z, a, factor, loading, cholesky)
+            theta = _twist_parameter(pz, loss, threshold)
+            e = np.exp(np.minimum(np.outer(theta, loss), 700.0))
+            twisted = pz * e / (1.0 + pz * (e - 1.0))
+            losses = (rng.random((size, len(a))) < twisted).astype(float).dot(loss)
+            log_weight += _conditional_cgf(theta, pz, loss) - theta * losses
+        yield losses, np.exp(log_weight)
+
+
+def simulate_losses(portfolio, correlation, loadings, scenarios=None, batch_size=None, seed=None):
+    """Generate the simulated portfolio losses in batches of scenarios.
+
+    Each batch draws the systematic factors (batch x F) and the idiosyncratic shocks (batch x n)
+    as matrices, so that memory is bounded by the batch size and not by the number of scenarios.
+    The loss of a defaulted obligor is its exposure times the LGD (when the portfolio has an LGD
+    column) or its exposure. Facilities with the same obligor identifier are netted to one obligor
+    (Portfolio.netted) and default together.
+
+    :param portfolio: A Portfolio object
+    :param correlation: The factor correlation matrix
+    :param loadings: The factor loadings
+    :param scenarios: The number of scenarios (default settings.MC_SCENARIOS)
+    :param batch_size: The number of scenarios per batch (default BLOCK_SIZE / n)
+    :param seed: The seed (or numpy Generator) of the random numbers
+    :return: Generator of loss arrays (one per batch)
+
+    """
+    arrays = _simulation_arrays(portfolio, correlation, loadings)
+    scenarios = settings.MC_SCENARIOS if scenarios is None else scenarios
+    batch_size = max(1, settings.BLOCK_SIZE // max(len(arrays[0]), 1)) if batch_size is None else batch_size
+    for losses, weights in _loss_batches(arrays, scenarios, batch_size, np.random.default_rng(seed)):
+        yield losses
+
+
+class LossMoments(object):
+    """ The _`LossMoments` object accumulates the weighted mean and variance of loss batches.
+
+    Batches are combined with the pairwise (Chan et al.) update of the mean and the sum of squared
+    deviations, which is numerically stable and allows merging partial results.
+
+    """
+
+    def __init__(self):
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, losses, weights=None):
+        """Add a batch of losses (with optional weights).
+
+        :param losses: The losses
+        :param weights: The weights of the losses (default 1)
+        """
+        losses = np.asarray(losses, dtype=float)
+        weights = np.ones_like(losses) if weights is None else np.asarray(weights, dtype=float)
+        weight = np.sum(weights)
+        if weight == 0:
+            return
+        mean = np.dot(weights, losses) / weight
+        other = LossMoments()
+        other.weight, other.mean, other.m2 = weight, mean, np.dot(weights, (losses - mean) ** 2)
+        self.merge(other)
+
+    def merge(self, other):
+        """Merge the moments of another accumulator.
+
+        :param other: A LossMoments object
+        """
+        weight = self.weight + other.weight
+        if weight == 0:
+            return
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.weight * other.weight / weight
+        self.mean += delta * other.weight / weight
+        self.weight = weight
+
+    def variance(self):
+        """The (population) variance of the losses."""
+        return self.m2 / self.weight if self.weight > 0 else 0.0
+
+
+class LossSummary(object):
+    """ The _`LossSummary` object is the compact, mergeable summary of a sample of (weighted) losses.
+
+    It holds the LossMoments of the sample and a QuantileSketch of the losses (a logarithmic
+    histogram with a relative accuracy guarantee on the quantiles), so that memory does not grow
+    with the number of scenarios. The VaR, the expected shortfall and the tail probability variance
+    follow from the sketch buckets. Summaries of independent workers are merged instead of
+    collecting the simulated losses.
+
+    """
+
+    def __init__(self, accuracy=None):
+        """Create an empty summary.
+
+        :param accuracy: The relative accuracy of the loss quantiles (default settings.SKETCH_ACCURACY)
+        """
+        self.moments = LossMoments()
+        self.sketch = QuantileSketch(accuracy)
+        self.weighted = False
+
+    @property
+    def count(self):
+        """The number of summarized scenarios."""
+        return self.sketch.count
+
+    def update(self, losses, weights=None):
+        """Add a batch of losses (with optional likelihood ratio weights).
+
+        :param losses: The losses
+        :param weights: The weights of the losses (default 1)
+        """
+        self.moments.update(losses, weights)
+        self.sketch.update(losses, weights)
+        self.weighted = self.weighted or weights is not None
+
+    def merge(self, other):
+        """Merge the summary of another sample (with the same accuracy).
+
+        :param other: A LossSummary object
+        """
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.weighted = self.weighted or other.weighted
+
+    def statistics(self, confidence=CONFIDENCE_LEVELS):
+        """Estimates from the summary.
+
+        :param confidence: The confidence levels of the VaR and expected shortfall
+        With likelihood ratio weights (importance sampling) the mean and the loss volatility are None:
+        the weighted moments are dominated by the rarely sampled body of the distribution and are
+        not reliable estimates.
+
+        :return: Dictionary with the mean, the loss volatility (ul), the number of scenarios, the effective sample size (ess) and per confidence level VaR, expected shortfall (es) and variance_reduction
+        """
+        var, es, variance_reduction = {}, {}, {}
+        for alpha in confidence:
+            quantile, shortfall, exceedance, second_moment = self.sketch.tail_statistics(alpha)
+            var[alpha] = quantile
+            es[alpha] = shortfall
+            # tail probability estimator w 1{L > VaR} against the plain Monte Carlo indicator
+            is_variance = second_moment - exceedance * exceedance
+            variance_reduction[alpha] = float(exceedance * (1 - exceedance) / is_variance) if is_variance > 0 else 1.0
+        weight, weight2, _ = self.sketch.buckets()
+        total = np.sum(weight)
+        return {
+            'mean': None if self.weighted else float(self.moments.mean),
+            'ul': None if self.weighted else math.sqrt(self.moments.variance()),
+            'scenarios': self.count,
+            'ess': float(total * total / np.sum(weight2)) if total > 0 else 0.0,
+            'var': var,
+            'es': es,
+            'variance_reduction': variance_reduction,
+        }
+
+
+def _summary_task(arrays, scenarios, batch_size, seed, shift, threshold, sobol_seed=None, start=0):
+    """Simulate scenarios and return their LossSummary (worker task).
+
+    The random numbers are drawn from the seed (a SeedSequence or a Generator). With a Sobol seed
+    the factors are the points [start, start + scenarios) of the Sobol sequence scrambled by that
+    seed, so that workers share one randomization.
+    """
+    rng = np.random.default_rng(seed)
+    factor_draws = None
+    if sobol_seed is not None:
+        factor_draws = _sobol_draws(len(arrays[4]), np.random.default_rng(sobol_seed), start)
+    summary = LossSummary()
+    for losses, weights in _loss_batches(arrays, scenarios, batch_size, rng, shift, threshold, factor_draws):
+        summary.update(losses, weights)
+    return summary
+
+
+def _parallel_summaries(arrays, size, batch_size, seed, shift, threshold, sampling, randomizations, workers):
+    """The LossSummary of each replication, with the scenarios split over a process pool."""
+    # one independent stream per (replication, worker), plus one Sobol scramble per replication
+    tasks = []
+    bounds = np.linspace(0, size, workers + 1).astype(int)
+    for replication in np.random.SeedSequence(seed).spawn(randomizations):
+        children = replication.spawn(workers + 1)
+        sobol_seed = children[0] if sampling == 'Sobol' else None
+        for worker in range(workers):
+            tasks.append((arrays, int(bounds[worker + 1] - bounds[worker]), batch_size, children[worker + 1], shift,
+                          threshold, sobol_seed, int(bounds[worker])))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_summary_task, *zip(*tasks)))
+    # merge the worker summaries of each replication in a fixed order
+    summaries = []
+    for r in range(randomizations):
+        summary = results[r * workers]
+        for other in results[r * workers + 1:(r + 1) * workers]:
+            summary.merge(other)
+        summaries.append(summary)
+    return summaries
+
+
+def _combine_replications(summaries, confidence):
+    """Merge independent replications and estimate the standard errors from their spread.
+
+    The estimates are those of the merged summary (a single quantile of all replications, so that
+    the VaR is one of the possible loss levels), the spread of the replication estimates only
+    enters the standard errors.
+
+    :return: Tuple of (statistics of the merged summary with replications and error, merged summary)
+    """
+    def standard_error(values):
+        if values[0] is None:
+            return None
+        return float(np.std(np.asarray(values, dtype=float), ddof=1) / math.sqrt(len(values)))
+
+    results = [summary.statistics(confidence) for summary in summaries]
+    merged = summaries[0]
+    for summary in summaries[1:]:
+        merged.merge(summary)
+    result = merged.statistics(confidence)
+    result['replications'] = len(results)
+    result['error'] = None
+    if len(results) > 1:
+        result['error'] = {
+            'mean': standard_error([result['mean'] for result in results]),
+            'ul': standard_error([result['ul'] for result in results]),
+            'var': {alpha: standard_error([result['var'][alpha] for result in results]) for alpha in confidence},
+            'es': {alpha: standard_error([result['es'][alpha] for result in results]) for alpha in confidence},
+        }
+    return result, merged
+
+
+def _exact_moments(portfolio, correlation, loadings, arrays):
+    """The expected loss and the loss volatility (Credit Metrics) of the simulated loss amounts."""
+    portfolio = portfolio.netted()
+    p = np.asarray(portfolio.rating, dtype=float)
+    loss = arrays[1]
+    amounts = Portfolio(len(p), rating=p, exposure=loss, factor=portfolio.factor)
+    variance = creditmetrics.variance(amounts, correlation, loadings, method='Bucketed')
+    return float(np.dot(p, loss)), math.sqrt(max(variance, 0.0))
+
+
+def loss_statistics(portfolio, correlation, loadings, scenarios=None, confidence=CONFIDENCE_LEVELS, batch_size=None,
+                    seed=None, importance=None, threshold=None, sampling='Pseudo', randomizations=None, workers=None):
+    """Monte Carlo estimates of the portfolio loss distribution.
+
+    The moments and a quantile sketch of the losses are accumulated batch by batch in a LossSummary,
+    the simulated losses are not stored, so that memory does not grow with the number of scenarios.
+    The VaR is within the relative accuracy settings.SKETCH_ACCURACY of the quantile of the
+    simulated losses. The result also holds the merged sketch of all replications (sketch).
+
+    With importance sampling the systematic factors are drawn around the mean shift of
+    importance_shift (Shift) and in addition the conditional default probabilities are
+    exponentially twisted towards the loss threshold (Twist). The tail estimates are likelihood
+    ratio weighted, the mean and loss volatility are the exact expected loss sum p_i c_i and the
+    square root of the Credit Metrics variance (Bucketed method) of the loss amounts c_i, with zero
+    standard errors. The effective sample size (sum w)^2 / sum w^2 and, per confidence level, the ratio of
+    the plain Monte Carlo variance to the importance sampling variance of the estimated tail
+    probability beyond the VaR (variance_reduction) measure the efficiency of the sampling.
+
+    With Sobol sampling the systematic factors are drawn from independently scrambled Sobol
+    sequences (randomized quasi-Monte Carlo). The scenarios are split into the given number of
+    randomizations of 2^m points each (the number of scenarios is rounded up accordingly), the
+    estimates are those of the merged summary of all randomizations (the VaR is a single quantile
+    of all scenarios, not an average of quantiles) and their standard errors are estimated from
+    the spread between randomizations. Pseudo-random sampling with randomizations > 1 reports
+    the same independent replication errors.
+
+    With workers the scenarios of each replication are split evenly over a process pool. The
+    random number streams of the workers are spawned from the seed with numpy SeedSequence (the
+    Sobol scramble of a replication is shared by its workers), each worker returns a LossSummary
+    and the summaries are merged in worker order. The results are identical for the same seed and
+    number of workers (but differ from the serial calculation).
+
+    :param portfolio: A Portfolio object
+    :param correlation: The factor correlation matrix
+    :param loadings: The factor loadings
+    :param scenarios: The number of scenarios (default settings.MC_SCENARIOS)
+    :param confidence: The confidence levels of the VaR and expected shortfall
+    :param batch_size: The number of scenarios per batch (default BLOCK_SIZE / n)
+    :param seed: The seed (or numpy Generator, an integer seed with workers) of the random numbers
+    :param importance: The importance sampling mode (None, Shift, Twist)
+    :param threshold: The loss threshold of the importance sampling (default see importance_shift)
+    :param sampling: The sampling of the systematic factors (Pseudo, Sobol)
+    :param randomizations: The number of independent replications (default settings.QMC_RANDOMIZATIONS for Sobol, 1 for Pseudo)
+    :param workers: The number of worker processes (default None, serial calculation)
+    :return: Dictionary with the mean, the loss volatility (ul), the number of scenarios, the effective sample size (ess), per confidence level VaR, expected shortfall (es) and variance_reduction, the number of replications and their standard errors (error, None for a single replication) and the QuantileSketch of the losses (sketch)
+
+    :Example:
+
+    >>> loss_statistics(portfolio, [[1.0]], [0.3], scenarios=100000, seed=42, importance='Twist')
+
+    """
+    if importance is not None and importance not in IMPORTANCE_METHODS:
+        raise ValueError('Unknown importance sampling method: ' + str(importance))
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError('Unknown sampling method: ' + str(sampling))
+    arrays = _simulation_arrays(portfolio, correlation, loadings)
+    scenarios = settings.MC_SCENARIOS if scenarios is None else scenarios
+    batch_size = max(1, settings.BLOCK_SIZE // max(len(arrays[0]), 1)) if batch_size is None else batch_size
+    shift = None
+    if importance is not None:
+        shift, threshold = _importance_shift(*arrays, threshold, max(confidence))
+        threshold = threshold if importance == 'Twist' else None
+
+    if randomizations is None:
+        randomizations = settings.QMC_RANDOMIZATIONS if sampling == 'Sobol' else 1
+    size = -(-scenarios // randomizations)
+    if sampling == 'Sobol':
+        size = 2 ** int(math.ceil(math.log2(size)))
+
+    if workers is None:
+        rng = np.random.default_rng(seed)
+        summaries = [_summary_task(arrays, size, batch_size, rng, shift, threshold, rng if sampling == 'Sobol' else None)
+                     for _ in range(randomizations)]
+    else:
+        summaries = _parallel_summaries(arrays, size, batch_size, seed, shift, threshold, sampling, randomizations,
+                                        workers)
+    result, merged = _combine_replications(summaries, confidence)
+    if importance is not None:
+        result['mean'], result['ul'] = _exact_moments(portfolio, correlation, loadings, arrays)
+        if result['error'] is not None:
+            result['error'].update(mean=0.0, ul=0.0)
+    result['sketch'] = merged.sketch
+    return result
@@ -20,3 +20,14 @@ GRID_POINTS = 3000
 PRECISION = 1.e-8
 SCALE = 7.0
 DELTA = 2000
+BLOCK_SIZE = 2 ** 20
+TETRACHORIC_ORDER = 20
+INTEGRATION_METHOD = 'Riemann'
+HERMITE_POINTS = 64
+MAX_HERMITE_POINTS = 256
+MAX_KRONROD_LEVELS = 30
+BIVARIATE_NORMAL_METHOD = 'Genz'
+MC_SCENARIOS = 100000
+QMC_RANDOMIZATIONS = 8
+SKETCH_ACCURACY = 1.e-3
+SKETCH_MIN_VALUE = 1.e-9
@@ -0,0 +1,257 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk (https://www.openriskmanagement.com)
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Precomputed lookup tables of Vasicek functions.
+
+* generate_table_ evaluates a Vasicek function on a dense grid (in parallel) and stores it in a binary file
+* LookupTable_ memory-maps a stored table and answers queries by multilinear interpolation
+
+The table file consists of a short JSON header (function name, axes, interpolation error estimate)
+followed by the table values as little-endian float64 in C order. Loading a table only requires
+numpy (scipy is not imported).
+
+"""
+
+import bisect
+import json
+import math
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MAGIC = b'PAVT'
+VERSION = 2
+ALIGNMENT = 64
+
+# Factor applied to the largest interpolation error found at the sub-cell midpoints
+ERROR_SAFETY_FACTOR = 2.0
+
+# Supported functions and the names of their arguments (table axes)
+TABLE_FUNCTIONS = {
+    'vasicek_lim_q': ('alpha', 'p', 'rho'),
+    'vasicek_lim_ul': ('p', 'rho'),
+    'vasicek_base_ul': ('N', 'p', 'rho'),
+}
+
+# Coordinate transformation applied to each axis before interpolation
+AXIS_TRANSFORMS = {
+    'alpha': 'neglog1m',
+    'p': 'log',
+    'N': 'log',
+    'rho': 'linear',
+}
+
+
+def _transform(values, transform):
+    """Map axis values to the interpolation coordinates."""
+    values = np.asarray(values, dtype=float)
+    if transform == 'log':
+        return np.log(values)
+    elif transform == 'neglog1m':
+        return - np.log1p(-values)
+    return values
+
+
+def _transform_scalar(value, transform):
+    """Map a scalar axis value to the interpolation coordinates."""
+    if transform == 'log':
+        return math.log(value)
+    elif transform == 'neglog1m':
+        return - math.log1p(-value)
+    return value
+
+
+def _evaluate(function, grids):
+    """Evaluate a Vasicek function on the outer product of the grids (worker task)."""
+    import portfolioAnalytics.vasicek as va
+    return np.asarray(getattr(va, function)(*np.meshgrid(*grids, indexing='ij')), dtype=float)
+
+
+def _evaluate_parallel(function, grids, workers):
+    """Evaluate a function on a grid, splitting the first axis over a process pool."""
+    if workers == 1 or len(grids[0]) == 1:
+        return _evaluate(function, grids)
+    chunks = np.array_split(np.asarray(grids[0]), min(workers, len(grids[0])))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_evaluate, [function] * len(chunks), [[chunk] + list(grids[1:]) for chunk in chunks])
+        return np.concatenate(list(results), axis=0)
+
+
+def generate_table(filename, function, axes, workers=None):
+    """Generate a lookup table of a Vasicek function and store it in a binary file.
+
+    The table is evaluated on the outer product of the axes, with the first axis split over a
+    process pool. The interpolation error is estimated by comparing exact and interpolated values
+    at all sub-cell midpoints (the cell centres and the face and edge midpoints, 3^d - 1 points
+    per cell, where the quadratic error terms of multilinear interpolation are largest),
+    multiplied by ERROR_SAFETY_FACTOR, and is stored in the file header. It is a heuristic
+    estimate, not a bound: the interpolation error at other points can exceed it.
+
+    :param filename: The output file
+    :param function: The function name (one of TABLE_FUNCTIONS)
+    :param axes: The grid values of the function arguments, in the order of the function signature
+    :param workers: The number of worker processes (default the number of CPUs)
+    :return: A LookupTable for the generated file
+
+    :Example:
+
+    >>> generate_table('lim_q.tbl', 'vasicek_lim_q', [[0.99, 0.999], np.geomspace(1e-4, 0.5, 200), np.linspace(0.01, 0.5, 50)])
+
+    """
+    if function not in TABLE_FUNCTIONS:
+        raise ValueError('Unsupported table function: ' + str(function))
+    names = TABLE_FUNCTIONS[function]
+    if len(axes) != len(names):
+        raise ValueError('Expected axes for ' + ', '.join(names))
+    workers = os.cpu_count() if workers is None else workers
+    axes = [np.sort(np.asarray(axis, dtype=float)) for axis in axes]
+    transforms = [AXIS_TRANSFORMS[name] for name in names]
+    coordinates = [_transform(axis, transform) for axis, transform in zip(axes, transforms)]
+
+    # the grid refined by the cell midpoints (in interpolation coordinates) along every axis: the
+    # even points are the table nodes, all other points are the sub-cell midpoints
+    refined = []
+    for axis, x, transform in zip(axes, coordinates, transforms):
+        if len(axis) == 1:
+            refined.append(axis)
+            continue
+        x = 0.5 * (x[1:] + x[:-1])
+        if transform == 'log':
+            x = np.exp(x)
+        elif transform == 'neglog1m':
+            x = -np.expm1(-x)
+        grid = np.empty(2 * len(axis) - 1)
+        grid[::2] = axis
+        grid[1::2] = x
+        refined.append(grid)
+    exact = _evaluate_parallel(function, refined, workers)
+    values = np.ascontiguousarray(exact[tuple(slice(None, None, 1 if len(axis) == 1 else 2) for axis in axes)])
+
+    approximate = _interpolate(values, axes, coordinates, transforms, names,
+                               np.meshgrid(*refined, indexing='ij'))
+    error = ERROR_SAFETY_FACTOR * np.abs(approximate - exact)
+    header = {
+        'function': function,
+        'axes': [{'name': name, 'transform': transform, 'values': axis.tolist()}
+                 for name, transform, axis in zip(names, transforms, axes)],
+        'shape': list(values.shape),
+        'abs_error_estimate': float(np.max(error)),
+        'rel_error_estimate': float(np.max(error / np.maximum(np.abs(exact), np.finfo(float).tiny))),
+    }
+    _write_table(filename, header, values)
+    return LookupTable(filename)
+
+
+def _write_table(filename, header, values):
+    """Write the header and the table values to a binary file."""
+    encoded = json.dumps(header).encode('utf8')
+    offset = len(MAGIC) + 12 + len(encoded)
+    encoded = encoded + b' ' * (-offset % ALIGNMENT)
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<IQ', VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(np.ascontiguousarray(values, dtype='<f8').tobytes())
+
+
+def _interpolate(values, axes, coordinates, transforms, names, args):
+    """Multilinear interpolation of a table over (broadcast) arrays of arguments."""
+    args = np.broadcast_arrays(*[np.asarray(arg, dtype=float) for arg in args])
+    shape = args[0].shape
+    strides = np.cumprod((values.shape + (1,))[:0:-1])[::-1]
+    values = values.reshape(-1)
+    index = 0
+    offsets = np.zeros(1, dtype=int)
+    weights = np.ones((1, args[0].size))
+    for arg, axis, coordinates, transform, name, stride in zip(args, axes, coordinates, transforms, names, strides):
+        arg = arg.ravel()
+        if np.any(arg < axis[0]) or np.any(arg > axis[-1]):
+            raise ValueError('Argument ' + name + ' outside the table range')
+        if len(axis) == 1:
+            continue
+        x = _transform(arg, transform)
+        i = np.clip(np.searchsorted(coordinates, x, side='right') - 1, 0, len(axis) - 2)
+        w = (x - coordinates[i]) / (coordinates[i + 1] - coordinates[i])
+        index = index + i * stride
+        # each existing corner splits into a lower and an upper corner along this axis
+        offsets = np.concatenate([offsets, offsets + stride])
+        weights = np.concatenate([weights * (1.0 - w), weights * w])
+    result = np.sum(weights * values[index + offsets[:, np.newaxis]], axis=0)
+    return result.reshape(shape)
+
+
+class LookupTable(object):
+    """ The _`LookupTable` object memory-maps a stored Vasicek table and interpolates it.
+
+    Queries are answered by multilinear interpolation in the transformed axis coordinates
+    (log p, log N, -log(1 - alpha), rho). The attributes abs_error_estimate and rel_error_estimate
+    hold the interpolation error estimated at the sub-cell midpoints when the table was generated
+    (an estimate that can be exceeded, see generate_table).
+
+    """
+
+    def __init__(self, filename):
+        """Load (memory-map) a lookup table.
+
+        :param filename: The table file produced by generate_table
+        :raises ValueError: if the file is not a lookup table or was written with another format version
+        """
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not a lookup table file: ' + str(filename))
+            version, length = struct.unpack('<IQ', f.read(12))
+            if version != VERSION:
+                raise ValueError('Unsupported lookup table version {} (expected {}): {}'.format(version, VERSION, filename))
+            header = json.loads(f.read(length).decode('utf8'))
+        self.function = header['function']
+        self.names = [axis['name'] for axis in header['axes']]
+        self.transforms = [axis['transform'] for axis in header['axes']]
+        self.axes = [np.array(axis['values']) for axis in header['axes']]
+        self.coordinates = [_transform(axis, transform) for axis, transform in zip(self.axes, self.transforms)]
+        self._coordinate_lists = [coordinates.tolist() for coordinates in self.coordinates]
+        self.abs_error_estimate = header['abs_error_estimate']
+        self.rel_error_estimate = header['rel_error_estimate']
+        self.values = np.memmap(filename, dtype='<f8', mode='r', offset=len(MAGIC) + 12 + length,
+                                shape=tuple(header['shape']))
+
+    def __call__(self, *args):
+        """Interpolate the table at the given arguments (broadcast like NumPy ufuncs).
+
+        :return: The interpolated function values
+        :raises ValueError: if an argument lies outside the table range
+        """
+        if len(args) != len(self.names):
+            raise ValueError('Expected arguments ' + ', '.join(self.names))
+        if all(np.isscalar(arg) for arg in args):
+            return self._interpolate_scalar(args)
+        return _interpolate(self.values, self.axes, self.coordinates, self.transforms, self.names, args)
+
+    def _interpolate_scalar(self, args):
+        """Interpolate the table at a single point without array overhead."""
+        corners = [((), 1.0)]
+        for arg, axis, coordinates, transform, name in zip(args, self.axes, self._coordinate_lists, self.transforms,
+                                                           self.names):
+            if arg < axis[0] or arg > axis[-1]:
+                raise ValueError('Argument ' + name + ' outside the table range')
+            if len(coordinates) == 1:
+                corners = [(index + (0,), weight) for index, weight in corners]
+                continue
+            x = _transform_scalar(arg, transform)
+            i = min(max(bisect.bisect_right(coordinates, x) - 1, 0), len(coordinates) - 2)
+            w = (x - coordinates[i]) / (coordinates[i + 1] - coordinates[i])
+            corners = [(index + (i,), weight * (1.0 - w)) for index, weight in corners] + \
+                      [(index + (i + 1,), weight * w) for index, weight in corners]
+        return float(sum(weight * self.values[index] for index, weight in corners))
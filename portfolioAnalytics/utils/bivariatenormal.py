@@ -18,15 +18,40 @@
 
 import math
 
-from scipy import stats
+import numpy as np
+from scipy import special
 
 
+from portfolioAnalytics import settings
+
+# Drezner quadrature weights and abscissae
+APARA = np.array([0.13410918845336, 0.26833075447264, 0.275953397988422, 0.15744828261879,
+                  4.48141099174625E-02, 5.36793575602526E-03, 2.02063649132407E-04, 1.19259692659532E-06])
+BPARA = np.array([5.29786439318514E-02, 0.267398372167767, 0.616302884182402, 1.06424631211623,
+                  1.58885586227006, 2.18392115309586, 2.86313388370808, 3.6860071627244])
+
+# Genz Gauss-Legendre rules (6, 12 and 20 points) on the nodes 1 -/+ x
+GENZ_RULES = []
+for _w, _x in [([0.1713244923791705, 0.3607615730481384, 0.4679139345726904],
+                [0.9324695142031522, 0.6612093864662647, 0.2386191860831970]),
+               ([0.04717533638651177, 0.1069393259953183, 0.1600783285433464,
+                 0.2031674267230659, 0.2334925365383547, 0.2491470458134029],
+                [0.9815606342467191, 0.9041172563704750, 0.7699026741943050,
+                 0.5873179542866171, 0.3678314989981802, 0.1252334085114692]),
+               ([0.01761400713915212, 0.04060142980038694, 0.06267204833410906,
+                 0.08327674157670475, 0.1019301198172404, 0.1181945319615184,
+                 0.1316886384491766, 0.1420961093183821, 0.1491729864726037, 0.1527533871307259],
+                [0.9931285991850949, 0.9639719272779138, 0.9122344282513259,
+                 0.8391169718222188, 0.7463319064601508, 0.6360536807265150,
+                 0.5108670019508271, 0.3737060887154196, 0.2277858511416451, 0.07652652113349733])]:
+    GENZ_RULES.append((np.concatenate([1 - np.array(_x), 1 + np.array(_x)]), np.concatenate([_w, _w])))
+
 # all arguments are double
 
 # wrapper for cumulative normal density
 def N(x):
     """Standard Normal."""
-    return stats.norm.cdf(x, loc=0.0, scale=1.0)
+    return special.ndtr(x)
 
 
 def BivariateNormalDistribution(a, b, rho):
@@ -69,6 +94,214 @@ def BivariateNormalDistribution(a, b, rho):
     return value
 
 
+def BivariateNormalDistributionArray(a, b, rho, method=None):
+    """Bivariate Normal Distribution evaluated over (broadcast) arrays of a, b, rho.
+
+    The available methods are
+
+    * Drezner: Z. Drezner, "Computation of the bivariate normal integral", Mathematics of Computation 32, pp. 277-279, 1978 (8-point Gaussian quadrature, the array version of BivariateNormalDistribution)
+    * Genz: A. Genz, "Numerical computation of rectangular bivariate and trivariate normal and t probabilities", Statistics and Computing 14, pp. 251-260, 2004 (6, 12 or 20-point Gauss-Legendre depending on rho, with a separate expansion for high correlation)
+    * OwensT: reduction to Owen's T function (scipy.special.owens_t)
+
+    :param a: The first upper integration limit
+    :param b: The second upper integration limit
+    :param rho: The correlation
+    :param method: The method (default settings.BIVARIATE_NORMAL_METHOD)
+    :return: The bivariate normal distribution values with the broadcast shape of the arguments
+
+    """
+    method = settings.BIVARIATE_NORMAL_METHOD if method is None else method
+    if method not in BIVARIATE_NORMAL_METHODS:
+        raise ValueError('Unknown bivariate normal method: ' + str(method))
+    a, b, rho = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (a, b, rho)])
+    shape = a.shape
+    if shape == () and method == 'Drezner':
+        # single value: the scalar routine avoids the array machinery
+        return np.asarray(float(BivariateNormalDistribution(float(a), float(b), float(rho))))
+    return BIVARIATE_NORMAL_METHODS[method](a.ravel(), b.ravel(), rho.ravel()).reshape(shape)
+
+
+def _drezner_array(a, b, rho):
+    """Drezner method over 1d arrays.
+
+    The sign and degenerate correlation branches are handled with masks and the rhoc split
+    is applied as a second (non-recursive) pass.
+    """
+    value, split = _bvn_direct(a, b, rho)
+    if np.any(split):
+        a, b, rho = a[split], b[split], rho[split]
+        zero = np.zeros(len(a))
+        first, _ = _bvn_direct(a, zero, _rhoc_array(a, b, rho))
+        second, _ = _bvn_direct(b, zero, _rhoc_array(b, a, rho))
+        value[split] = first + second - 0.5 * (((a > 0) & (b < 0)) | ((a < 0) & (b > 0)))
+    return value
+
+
+def _bvn_direct(a, b, rho):
+    """Bivariate normal for all elements not requiring the rhoc split (1d arrays).
+
+    :return: Tuple of (values, mask of the elements requiring the rhoc split)
+    """
+    Epsilon = 1e-12
+    value = np.full(len(a), np.nan)
+
+    upper = rho > 1 - Epsilon
+    if np.any(upper):
+        value[upper] = N(np.minimum(a[upper], b[upper]))
+    lower = rho < -(1 - Epsilon)
+    if np.any(lower):
+        value[lower] = np.where(a[lower] < -b[lower], 0.0, N(a[lower]) - N(-b[lower]))
+    done = upper | lower
+
+    # quadrants reducing to Phi_Sum(sa * a, sb * b, sr * rho) with sign * Phi_Sum + offset
+    cases = [(a <= 0) & (b <= 0) & (rho <= 0),
+             (a <= 0) & (b >= 0) & (rho >= 0),
+             (a >= 0) & (b <= 0) & (rho >= 0),
+             (a >= 0) & (b >= 0) & (rho <= 0)]
+    offsets = [lambda a, b: 0.0, lambda a, b: N(a), lambda a, b: N(b), lambda a, b: N(a) + N(b) - 1]
+    sa, sb, sr, sign = np.ones(len(a)), np.ones(len(a)), np.ones(len(a)), np.ones(len(a))
+    offset = np.zeros(len(a))
+    direct = np.zeros(len(a), dtype=bool)
+    for case, case_offset, (case_sa, case_sb, case_sr, case_sign) in zip(cases, offsets, [(1, 1, 1, 1), (1, -1, -1, -1),
+                                                                                          (-1, 1, -1, -1), (-1, -1, 1, 1)]):
+        # the first matching quadrant applies (as in the scalar version)
+        case = case & ~done & ~direct
+        if not np.any(case):
+            continue
+        sa[case], sb[case], sr[case], sign[case] = case_sa, case_sb, case_sr, case_sign
+        offset[case] = case_offset(a[case], b[case])
+        direct = direct | case
+    if np.any(direct):
+        quadrant = Phi_Sum_Array(sa[direct] * a[direct], sb[direct] * b[direct], sr[direct] * rho[direct])
+        value[direct] = offset[direct] + sign[direct] * quadrant
+    return value, ~(done | direct)
+
+
+def Phi_Sum_Array(a, b, rho):
+    """Phi Sum Helper Function over arrays, evaluating the 64 term sum as a tensor contraction."""
+    srtomr2 = np.sqrt(1.0 - rho) * np.sqrt(1.0 + rho)
+    fpa = (a / (math.sqrt(2.0) * srtomr2))[:, np.newaxis]
+    fpb = (b / (math.sqrt(2.0) * srtomr2))[:, np.newaxis]
+    rho = rho[:, np.newaxis, np.newaxis]
+
+    # exponent of term (i, j): fpa (2 B_i - fpa) + fpb (2 B_j - fpb) + 2 rho (B_i - fpa) (B_j - fpb)
+    chunk = max(1, settings.BLOCK_SIZE // 64)
+    total = np.empty(len(srtomr2))
+    for start in range(0, len(total), chunk):
+        stop = start + chunk
+        x = fpa[start:stop] * (2.0 * BPARA - fpa[start:stop])
+        y = fpb[start:stop] * (2.0 * BPARA - fpb[start:stop])
+        cross = 2.0 * rho[start:stop] * (BPARA - fpa[start:stop])[:, :, np.newaxis] * (BPARA - fpb[start:stop])[:, np.newaxis, :]
+        terms = np.exp(x[:, :, np.newaxis] + y[:, np.newaxis, :] + cross)
+        total[start:stop] = np.einsum('nij,i,j->n', terms, APARA, APARA)
+    return total * srtomr2 / math.pi
+
+
+def _rhoc_array(a, b, rho):
+    """Rho_c Helper Function over arrays."""
+    x = np.where(a < 0, -1.0, 1.0)
+    return x * (rho * a - b) / np.sqrt(a * a - 2 * rho * a * b + b * b)
+
+
+def _genz_array(a, b, rho):
+    """Genz method over 1d arrays (lower probability as the upper probability of (-a, -b))."""
+    h, k = -a, -b
+    hk = h * k
+    value = np.empty(len(h))
+    zero = rho == 0
+    if np.any(zero):
+        value[zero] = N(-h[zero]) * N(-k[zero])
+
+    # moderate correlation: Gauss-Legendre integration over asin(rho)
+    for low, high, x, w in [(0.0, 0.3) + GENZ_RULES[0], (0.3, 0.75) + GENZ_RULES[1], (0.75, 0.925) + GENZ_RULES[2]]:
+        mask = (np.abs(rho) >= low) & (np.abs(rho) < high) & ~zero
+        if not np.any(mask):
+            continue
+        hs = (h[mask] * h[mask] + k[mask] * k[mask]) / 2
+        asr = np.arcsin(rho[mask]) / 2
+        sn = np.sin(asr[:, np.newaxis] * x)
+        terms = np.exp((sn * hk[mask][:, np.newaxis] - hs[:, np.newaxis]) / (1 - sn * sn))
+        value[mask] = terms.dot(w) * asr / (2 * math.pi) + N(-h[mask]) * N(-k[mask])
+
+    # high correlation
+    mask = np.abs(rho) >= 0.925
+    if np.any(mask):
+        value[mask] = _genz_high_correlation(h[mask], k[mask], rho[mask])
+    return np.clip(value, 0.0, 1.0)
+
+
+def _genz_high_correlation(h, k, r):
+    """Upper bivariate normal probability of the Genz method for |rho| >= 0.925."""
+    x, w = GENZ_RULES[2]
+    k = np.where(r < 0, -k, k)
+    hk = h * k
+    value = np.zeros(len(h))
+    inner = np.abs(r) < 1
+    if np.any(inner):
+        hi, ki, hki, ri = h[inner], k[inner], hk[inner], r[inner]
+        a_s = 1 - ri * ri
+        a = np.sqrt(a_s)
+        bs = (hi - ki) ** 2
+        asr = -(bs / a_s + hki) / 2
+        c = (4 - hki) / 8
+        d = (12 - hki) / 80
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            bvn = np.where(asr > -100, a * np.exp(asr) * (1 - c * (bs - a_s) * (1 - d * bs) / 3 + c * d * a_s * a_s), 0.0)
+            b = np.sqrt(bs)
+            tail = np.exp(-hki / 2) * math.sqrt(2 * math.pi) * N(-b / a) * b * (1 - c * bs * (1 - d * bs) / 3)
+            bvn = bvn - np.where(hki > -100, tail, 0.0)
+            a = (a / 2)[:, np.newaxis]
+            xs = (a * x) ** 2
+            asr = -(bs[:, np.newaxis] / xs + hki[:, np.newaxis]) / 2
+            sp = 1 + c[:, np.newaxis] * xs * (1 + 5 * d[:, np.newaxis] * xs)
+            rs = np.sqrt(1 - xs)
+            ep = np.exp(-(hki[:, np.newaxis] / 2) * xs / (1 + rs) ** 2) / rs
+            terms = np.where(asr > -100, np.exp(asr) * (sp - ep), 0.0)
+        value[inner] = (a[:, 0] * terms.dot(w) - bvn) / (2 * math.pi)
+    positive = r > 0
+    value[positive] = value[positive] + N(-np.maximum(h[positive], k[positive]))
+    negative = ~positive
+    hn, kn = h[negative], k[negative]
+    lower = np.where(hn < 0, N(kn) - N(hn), N(-hn) - N(-kn))
+    value[negative] = np.where(hn >= kn, -value[negative], lower - value[negative])
+    return value
+
+
+def _owens_t_array(a, b, rho):
+    """Owen's T method over 1d arrays.
+
+    Phi_2(a, b; rho) = (Phi(a) + Phi(b)) / 2 - T(a, a_a) - T(b, a_b) - beta with
+    a_a = (b - rho a) / (a sqrt(1 - rho^2)), a_b = (a - rho b) / (b sqrt(1 - rho^2)).
+    """
+    Epsilon = 1e-12
+    value = np.empty(len(a))
+    upper = rho > 1 - Epsilon
+    lower = rho < -(1 - Epsilon)
+    if np.any(upper):
+        value[upper] = N(np.minimum(a[upper], b[upper]))
+    if np.any(lower):
+        value[lower] = np.maximum(N(a[lower]) - N(-b[lower]), 0.0)
+    mask = ~(upper | lower)
+    a, b, rho = a[mask], b[mask], rho[mask]
+    root = np.sqrt((1 - rho) * (1 + rho))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_a = np.where(a == 0, 0.25 * np.sign(b), special.owens_t(a, (b - rho * a) / (a * root)))
+        t_b = np.where(b == 0, 0.25 * np.sign(a), special.owens_t(b, (a - rho * b) / (b * root)))
+    beta = np.where((a * b > 0) | ((a * b == 0) & (a + b >= 0)), 0.0, 0.5)
+    result = 0.5 * (N(a) + N(b)) - t_a - t_b - beta
+    origin = (a == 0) & (b == 0)
+    result[origin] = 0.25 + np.arcsin(rho[origin]) / (2 * math.pi)
+    value[mask] = result
+    return value
+
+
+BIVARIATE_NORMAL_METHODS = {
+    'Drezner': _drezner_array,
+    'Genz': _genz_array,
+    'OwensT': _owens_t_array,
+}
+
+
 def BivariateNormalDensity(a, b, rho):
     """Bivariate Normal Density."""
     ONE_OVER_2PI = 0.15915494309189533576888376337251
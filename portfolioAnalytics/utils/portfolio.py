@@ -15,29 +15,40 @@
 """ This module provides simple functionality for holding portfolio data for calculation purposes.
 
 * Portfolio_ implements a simple portfolio data container
+* Portfolio.net_obligors aggregates facilities of the same obligor into obligor records (applied
+  automatically by the Credit Metrics and Monte Carlo calculations when obligor identifiers are present)
 
 """
 
 
 import numpy as np
 
+# Rules for the obligor PD when netting facilities with different PD
+NETTING_PD_RULES = ('check', 'max', 'weighted')
+
 
 class Portfolio(object):
     """ The _`Portfolio` object implements a simple portfolio data structure. See `loan tape <https://www.openriskmanual.org/wiki/Loan_Tape>`_ for more general structures.
 
     """
 
-    def __init__(self, psize=0, rating=[], exposure=[], factor=[]):
+    def __init__(self, psize=0, rating=None, exposure=None, factor=None, lgd=None, maturity=None, obligor=None):
         """Initialize portfolio.
 
         :param psize: initialization values
         :param rating: list of default probabilities
         :param exposure: list of exposures (numerical values, e.g. `Exposure At Default <https://www.openriskmanual.org/wiki/Exposure_At_Default>`_
         :param factor: list of factor indices (those should match the factors used e.g. in a correlation matrix
+        :param lgd: list of loss given default values (optional)
+        :param maturity: list of effective maturities in years (optional)
+        :param obligor: list of obligor identifiers of the facilities (optional)
         :type psize: int
         :type rating: list of floats
         :type exposure: list of floats
         :type factor: list of int
+        :type lgd: list of floats
+        :type maturity: list of floats
+        :type obligor: list
         :returns: returns a Portfolio object
         :rtype: object
 
@@ -45,9 +56,12 @@ class Portfolio(object):
 
         """
         self.psize = psize
-        self.exposure = exposure
-        self.rating = rating
-        self.factor = factor
+        self.exposure = [] if exposure is None else exposure
+        self.rating = [] if rating is None else rating
+        self.factor = [] if factor is None else factor
+        self.lgd = [] if lgd is None else lgd
+        self.maturity = [] if maturity is None else maturity
+        self.obligor = [] if obligor is None else obligor
 
     def loadjson(self, data):
         """Load portfolio data from JSON object.
@@ -60,19 +74,105 @@ class Portfolio(object):
               ...
              {"ID":"2","PD":"0.286","EAD":"20","FACTOR":0}]
 
+        The optional fields "LGD", "MATURITY" and "OBLIGOR" (the obligor identifier of a facility) are
+        loaded when present.
+
+        :raises ValueError: if an optional field is present in some but not all of the records
+
         """
+        for field in ('LGD', 'MATURITY', 'OBLIGOR'):
+            present = sum(field in x for x in data)
+            if 0 < present < len(data):
+                raise ValueError('Field ' + field + ' must be present in all or none of the records')
         self.psize = len(data)
         for x in data:
             self.exposure.append(float(x['EAD']))
             self.rating.append(float(x['PD']))
             self.factor.append(x['FACTOR'])
+            if 'LGD' in x:
+                self.lgd.append(float(x['LGD']))
+            if 'MATURITY' in x:
+                self.maturity.append(float(x['MATURITY']))
+            if 'OBLIGOR' in x:
+                self.obligor.append(x['OBLIGOR'])
+
+    def net_obligors(self, pd_rule='check'):
+        """Aggregate the facilities of each obligor into one obligor record.
+
+        Facilities with the same obligor identifier are a single default event and should enter the
+        pairwise (Credit Metrics) and Vasicek calculations as one name. The obligor exposure is the
+        sum of the facility exposures, the LGD and maturity are exposure weighted averages. The factor
+        of all facilities of an obligor must be the same. The obligor PD follows the pd_rule
+
+        * check: the PD of all facilities of an obligor must be the same
+        * max: the largest facility PD
+        * weighted: the exposure weighted average facility PD
+
+        :param pd_rule: The rule for the obligor PD (check, max, weighted)
+        :returns: A Portfolio object with one entry per obligor (in the order of first appearance)
+        :raises ValueError: if the facilities of an obligor have inconsistent PD (with the check rule) or factor
+
+        """
+        if pd_rule not in NETTING_PD_RULES:
+            raise ValueError('Unknown PD rule: ' + str(pd_rule))
+        if len(self.obligor) != len(self.exposure):
+            raise ValueError('Obligor identifiers are required for all facilities')
+        _, first, index = np.unique(np.asarray(self.obligor), return_index=True, return_inverse=True)
+        # order obligors by first appearance
+        order = np.argsort(first)
+        first = first[order]
+        index = np.argsort(order)[index.ravel()]
+        size = len(first)
+
+        exposure = np.asarray(self.exposure, dtype=float)
+        rating = np.asarray(self.rating, dtype=float)
+        factor = np.asarray(self.factor)
+        if np.any(factor != factor[first][index]):
+            raise ValueError('Inconsistent factor of the facilities of an obligor')
+        total = np.bincount(index, weights=exposure, minlength=size)
+
+        def weighted(values):
+            values = np.asarray(values, dtype=float)
+            result = np.bincount(index, weights=exposure * values, minlength=size)
+            # obligors with zero total exposure keep the value of the first facility
+            return np.where(total != 0, result / np.where(total != 0, total, 1.0), values[first])
+
+        if pd_rule == 'check':
+            if np.any(rating != rating[first][index]):
+                raise ValueError('Inconsistent PD of the facilities of an obligor')
+            obligor_rating = rating[first]
+        elif pd_rule == 'max':
+            obligor_rating = np.full(size, -np.inf)
+            np.maximum.at(obligor_rating, index, rating)
+        else:
+            obligor_rating = weighted(rating)
+
+        return Portfolio(size, obligor_rating.tolist(), total.tolist(), factor[first].tolist(),
+                         lgd=weighted(self.lgd).tolist() if len(self.lgd) else None,
+                         maturity=weighted(self.maturity).tolist() if len(self.maturity) else None,
+                         obligor=np.asarray(self.obligor)[first].tolist())
+
+    def netted(self, pd_rule='check'):
+        """The portfolio at obligor level, as used by the pairwise and simulation calculations.
+
+        :param pd_rule: The rule for the obligor PD (see net_obligors)
+        :returns: The result of net_obligors when obligor identifiers are present, otherwise the portfolio itself
+
+        """
+        return self.net_obligors(pd_rule=pd_rule) if len(self.obligor) else self
 
     def preprocess_portfolio(self):
         """
         Produce some portfolio statistics like total number of entities and exposure weighted average probability of default
+
+        When obligor identifiers are present the number of entities is the number of distinct obligors.
+
         :return:
+        :raises ValueError: if obligor identifiers are present for some but not all facilities
         """
-        N = self.psize
+        if len(self.obligor) and len(self.obligor) != len(self.exposure):
+            raise ValueError('Obligor identifiers are required for all facilities')
+        N = len(set(self.obligor)) if len(self.obligor) else self.psize
         Total_Exposure = np.sum(self.exposure)
         p = np.inner(self.rating, self.exposure) / Total_Exposure
         return N, p
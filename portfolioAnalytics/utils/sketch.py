@@ -0,0 +1,178 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk (https://www.openriskmanagement.com)
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" This module provides a streaming, mergeable quantile sketch for simulated losses.
+
+* QuantileSketch_ implements a fixed relative error logarithmic histogram (DDSketch style)
+
+"""
+
+import math
+
+import numpy as np
+
+from portfolioAnalytics import settings
+
+
+class _Store(object):
+    """Dense bucket arrays (weights, squared weights, weighted values) indexed by integer keys."""
+
+    def __init__(self):
+        self.offset = 0
+        self.weight = np.zeros(0)
+        self.weight2 = np.zeros(0)
+        self.weighted_value = np.zeros(0)
+
+    def _extend(self, low, high):
+        """Make room for the keys [low, high]."""
+        if len(self.weight) == 0:
+            self.offset = low
+        new_offset = min(self.offset, low)
+        size = max(self.offset + len(self.weight), high + 1) - new_offset
+        if new_offset == self.offset and size == len(self.weight):
+            return
+        start = self.offset - new_offset
+        for name in ('weight', 'weight2', 'weighted_value'):
+            old = getattr(self, name)
+            array = np.zeros(size)
+            array[start:start + len(old)] = old
+            setattr(self, name, array)
+        self.offset = new_offset
+
+    def add(self, keys, values, weights):
+        if len(keys) == 0:
+            return
+        low, high = int(keys.min()), int(keys.max())
+        self._extend(low, high)
+        index = keys - self.offset
+        size = len(self.weight)
+        self.weight += np.bincount(index, weights=weights, minlength=size)
+        self.weight2 += np.bincount(index, weights=weights * weights, minlength=size)
+        self.weighted_value += np.bincount(index, weights=weights * values, minlength=size)
+
+    def merge(self, other):
+        if len(other.weight) == 0:
+            return
+        self._extend(other.offset, other.offset + len(other.weight) - 1)
+        start = other.offset - self.offset
+        self.weight[start:start + len(other.weight)] += other.weight
+        self.weight2[start:start + len(other.weight)] += other.weight2
+        self.weighted_value[start:start + len(other.weight)] += other.weighted_value
+
+
+class QuantileSketch(object):
+    """ The _`QuantileSketch` object summarizes a stream of (weighted) values in constant memory.
+
+    Values are assigned to logarithmic buckets (gamma^(k-1), gamma^k] with gamma = 1 + e for the
+    relative accuracy e (negative values to mirrored buckets, values smaller in absolute terms than
+    min_value to a zero bucket), so that any two values in a bucket are within relative distance e.
+    Each bucket holds the sum of the weights, of the squared weights and of the weighted values. The
+    quantile estimate of the sketch is the weighted mean value of the bucket where the cumulative
+    probability is reached, so that it is within the relative accuracy e of the quantile of the
+    summarized values (exact when the bucket holds a single distinct value).
+    The number of buckets grows only with the logarithm of the range of the values, not with
+    their number, and sketches with the same accuracy are merged by adding their buckets.
+
+    """
+
+    def __init__(self, accuracy=None, min_value=None):
+        """Create an empty sketch.
+
+        :param accuracy: The relative accuracy of the quantiles (default settings.SKETCH_ACCURACY)
+        :param min_value: The smallest absolute value distinguished from zero (default settings.SKETCH_MIN_VALUE)
+        """
+        self.accuracy = settings.SKETCH_ACCURACY if accuracy is None else accuracy
+        self.min_value = settings.SKETCH_MIN_VALUE if min_value is None else min_value
+        self.gamma = 1.0 + self.accuracy
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.positive = _Store()
+        self.negative = _Store()
+        self.zero = np.zeros(3)
+
+    def update(self, values, weights=None):
+        """Add a batch of values (with optional weights).
+
+        :param values: The values
+        :param weights: The weights of the values (default 1)
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=float).ravel()
+        self.count += len(values)
+        magnitude = np.abs(values)
+        small = magnitude < self.min_value
+        self.zero += [np.sum(weights[small]), np.sum(weights[small] ** 2), np.dot(weights[small], values[small])]
+        keys = np.ceil(np.log(np.where(small, 1.0, magnitude)) / self._log_gamma).astype(int)
+        for store, mask in ((self.positive, (values > 0) & ~small), (self.negative, (values < 0) & ~small)):
+            store.add(keys[mask], values[mask], weights[mask])
+
+    def merge(self, other):
+        """Merge another sketch (with the same accuracy).
+
+        :param other: A QuantileSketch object
+        """
+        if (other.accuracy, other.min_value) != (self.accuracy, self.min_value):
+            raise ValueError('Quantile sketches with different accuracy')
+        self.count += other.count
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero += other.zero
+
+    def buckets(self):
+        """The non empty buckets in increasing order of values.
+
+        :return: Tuple of (weights, squared weights, weighted values) arrays
+        """
+        columns = []
+        for name in ('weight', 'weight2', 'weighted_value'):
+            column = np.concatenate([getattr(self.negative, name)[::-1], [self.zero[len(columns)]],
+                                     getattr(self.positive, name)])
+            columns.append(column)
+        occupied = columns[0] != 0
+        return tuple(column[occupied] for column in columns)
+
+    def size(self):
+        """The number of stored buckets."""
+        return len(self.positive.weight) + len(self.negative.weight) + 1
+
+    def tail_statistics(self, alpha):
+        """Quantile (Value-at-Risk), expected shortfall and tail exceedance moments.
+
+        The weights are taken as likelihood ratios: the probability of a bucket is its weight divided
+        by the number of values and the cumulative probabilities are estimated from the right tail,
+        1 - sum of the probabilities of the buckets above, which is the unbiased estimate for
+        importance sampling weights that rarely sample the body of the distribution. The atoms of
+        the quantile bucket are weighted so that the tail has probability 1 - alpha (Acerbi-Tasche).
+
+        :param alpha: The confidence level
+        :return: Tuple of (quantile, expected shortfall, exceedance probability, exceedance second moment) where the exceedance refers to the weights of the values above the quantile bucket
+        """
+        weight, weight2, weighted_value = self.buckets()
+        if len(weight) == 0:
+            raise ValueError('Empty quantile sketch')
+        probability = weight / self.count
+        cdf = 1.0 - np.concatenate([np.cumsum(probability[::-1])[-2::-1], [0.0]])
+        k = min(int(np.searchsorted(cdf, alpha, side='left')), len(weight) - 1)
+        quantile = weighted_value[k] / weight[k]
+        tail = np.sum(weighted_value[k + 1:]) / self.count
+        shortfall = (tail + quantile * (cdf[k] - alpha)) / (1 - alpha)
+        return float(quantile), float(shortfall), float(np.sum(probability[k + 1:])), float(np.sum(weight2[k + 1:]) / self.count)
+
+    def quantile(self, alpha):
+        """The alpha quantile of the summarized values (within the relative accuracy).
+
+        :param alpha: The confidence level
+        :return: The quantile estimate
+        """
+        return self.tail_statistics(alpha)[0]
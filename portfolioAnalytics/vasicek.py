@@ -18,13 +18,328 @@ See `Vasicek Distribution <https://www.openriskmanual.org/wiki/Vasicek_Distribut
 """
 
 import math
+import warnings
+from collections import OrderedDict, namedtuple
+from functools import lru_cache, wraps
 
-from scipy import stats
-from sympy import binomial
+import numpy as np
+from scipy import special, stats
 
 from portfolioAnalytics import settings
+from portfolioAnalytics.utils import bivariatenormal as bv
 
 
+@lru_cache(maxsize=None)
+def _quadrature_grid(grid_points, scale):
+    """Nodes and weights of the systematic factor grid.
+
+    The grid is cached per (GRID_POINTS, SCALE) pair so that the normal density is
+    evaluated only once for a given integration setting.
+
+    :param grid_points: The number of grid points
+    :param scale: The half-width of the integration interval
+    :return: Tuple of (nodes, weights) arrays
+    """
+    zmin = - scale
+    zmax = scale
+    dz = float(zmax - zmin) / float(grid_points - 1)
+    z = zmin + dz * np.arange(1, grid_points)
+    w = dz * stats.norm.pdf(z, loc=0.0, scale=1.0)
+    z.flags.writeable = False
+    w.flags.writeable = False
+    return z, w
+
+
+@lru_cache(maxsize=None)
+def _hermite_grid(points):
+    """Nodes and weights of the Gauss-Hermite rule for the standard normal density.
+
+    :param points: The number of nodes
+    :return: Tuple of (nodes, weights) arrays
+    """
+    z, w = np.polynomial.hermite_e.hermegauss(points)
+    w = w / math.sqrt(2.0 * math.pi)
+    z.flags.writeable = False
+    w.flags.writeable = False
+    return z, w
+
+
+# Gauss-Kronrod 7-15 rule (QUADPACK qk15) on [-1, 1]
+KRONROD_NODES = np.array([-0.991455371120812639206854697526329, -0.949107912342758524526189684047851,
+                          -0.864864423359769072789712788640926, -0.741531185599394439863864773280788,
+                          -0.586087235467691130294144845693013, -0.405845151377397166906606412076961,
+                          -0.207784955007898467600689403773245, 0.000000000000000000000000000000000,
+                          0.207784955007898467600689403773245, 0.405845151377397166906606412076961,
+                          0.586087235467691130294144845693013, 0.741531185599394439863864773280788,
+                          0.864864423359769072789712788640926, 0.949107912342758524526189684047851,
+                          0.991455371120812639206854697526329])
+KRONROD_WEIGHTS = np.array([0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                            0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                            0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                            0.204432940075298892414161999234649, 0.209482141084727828012999174891714,
+                            0.204432940075298892414161999234649, 0.190350578064785409913256402421014,
+                            0.169004726639267902826583426598550, 0.140653259715525918745189590510238,
+                            0.104790010322250183839876322541518, 0.063092092629978553290700663189204,
+                            0.022935322010529224963732008058970])
+GAUSS_WEIGHTS = np.array([0.0, 0.129484966168869693270611432679082, 0.0, 0.279705391489276667901467771423780,
+                          0.0, 0.381830050505118944950369775488975, 0.0, 0.417959183673469387755102040816327,
+                          0.0, 0.381830050505118944950369775488975, 0.0, 0.279705391489276667901467771423780,
+                          0.0, 0.129484966168869693270611432679082, 0.0])
+
+
+def _riemann_quadrature(integrand, chunk_size):
+    """Fixed grid (Riemann sum) integration.
+
+    The error is estimated by comparison with the rule using every second grid point, plus a
+    bound for the normal mass outside [-SCALE, SCALE].
+    """
+    z, w = _quadrature_grid(settings.GRID_POINTS, settings.SCALE)
+    chunk_size = len(z) if chunk_size is None else chunk_size
+    chunk_size = chunk_size + chunk_size % 2
+    integral = 0
+    coarse = 0
+    max_value = 0
+    for start in range(0, len(z), chunk_size):
+        stop = start + chunk_size
+        values = integrand(z[start:stop])
+        max_value = max(max_value, np.max(np.abs(values)))
+        integral = integral + np.tensordot(w[start:stop], values, axes=(0, 0))
+        coarse = coarse + 2.0 * np.tensordot(w[start:stop:2], values[::2], axes=(0, 0))
+    error = np.max(np.abs(integral - coarse)) + 2.0 * stats.norm.sf(settings.SCALE, loc=0.0, scale=1.0) * max_value
+    return integral, error, len(z)
+
+
+def _hermite_quadrature(integrand, chunk_size, tolerance):
+    """Gauss-Hermite integration over the whole real line.
+
+    The number of nodes starts at HERMITE_POINTS and is doubled until the difference
+    between successive rules is within tolerance (or MAX_HERMITE_POINTS is reached, in which
+    case a warning is issued).
+    """
+    points = settings.HERMITE_POINTS
+    evaluations = 0
+    previous = None
+    while True:
+        z, w = _hermite_grid(points)
+        chunk = len(z) if chunk_size is None else chunk_size
+        integral = 0
+        for start in range(0, len(z), chunk):
+            stop = start + chunk
+            integral = integral + np.tensordot(w[start:stop], integrand(z[start:stop]), axes=(0, 0))
+        evaluations = evaluations + len(z)
+        if previous is None:
+            z, w = _hermite_grid(points // 2)
+            previous = np.tensordot(w, integrand(z), axes=(0, 0))
+            evaluations = evaluations + len(z)
+        error = np.max(np.abs(integral - previous))
+        if error <= tolerance:
+            return integral, error, evaluations
+        if 2 * points > settings.MAX_HERMITE_POINTS:
+            warnings.warn('Gauss-Hermite integration did not reach the tolerance {:.1e} with MAX_HERMITE_POINTS = {} '
+                          '(estimated error {:.1e})'.format(tolerance, settings.MAX_HERMITE_POINTS, error), RuntimeWarning)
+            return integral, error, evaluations
+        previous = integral
+        points = 2 * points
+
+
+def _kronrod_quadrature(integrand, chunk_size, tolerance):
+    """Adaptive Gauss-Kronrod (7-15) integration on [-SCALE, SCALE].
+
+    At each pass all intervals whose Kronrod - Gauss difference exceeds their share of the
+    tolerance are bisected and re-evaluated together. The reported error is the sum of the
+    interval errors plus a bound for the normal mass outside [-SCALE, SCALE]. A warning is issued
+    when the error exceeds the tolerance (after MAX_KRONROD_LEVELS bisections or because of the
+    truncation to [-SCALE, SCALE]).
+    """
+    scale = settings.SCALE
+    lower = np.array([-scale])
+    upper = np.array([scale])
+    integral = 0
+    error = 0
+    evaluations = 0
+    max_value = 0
+    for level in range(settings.MAX_KRONROD_LEVELS + 1):
+        half = 0.5 * (upper - lower)
+        centre = 0.5 * (upper + lower)
+        z = (centre[:, np.newaxis] + half[:, np.newaxis] * KRONROD_NODES).ravel()
+        density = stats.norm.pdf(z, loc=0.0, scale=1.0)
+        chunk = len(z) if chunk_size is None else max(15, chunk_size - chunk_size % 15)
+        kronrod = []
+        gauss = []
+        for start in range(0, len(z), chunk):
+            stop = start + chunk
+            values = integrand(z[start:stop])
+            max_value = max(max_value, np.max(np.abs(values)))
+            values = (density[start:stop] * values.T).T
+            values = values.reshape((-1, 15) + values.shape[1:])
+            kronrod.append(np.tensordot(values, KRONROD_WEIGHTS, axes=(1, 0)).T)
+            gauss.append(np.tensordot(values, GAUSS_WEIGHTS, axes=(1, 0)).T)
+        kronrod = (half * np.concatenate(kronrod, axis=-1)).T
+        gauss = (half * np.concatenate(gauss, axis=-1)).T
+        evaluations = evaluations + len(z)
+        interval_error = np.abs(kronrod - gauss).reshape(len(half), -1).max(axis=1)
+        # accept intervals meeting their share of the tolerance (all of them at the last level)
+        accept = interval_error <= tolerance * half / scale
+        if level == settings.MAX_KRONROD_LEVELS:
+            accept[:] = True
+        integral = integral + kronrod[accept].sum(axis=0)
+        error = error + interval_error[accept].sum()
+        if accept.all():
+            break
+        lower, upper = lower[~accept], upper[~accept]
+        middle = 0.5 * (lower + upper)
+        lower, upper = np.concatenate([lower, middle]), np.concatenate([middle, upper])
+    error = error + 2.0 * stats.norm.sf(scale, loc=0.0, scale=1.0) * max_value
+    if error > tolerance:
+        warnings.warn('Gauss-Kronrod integration did not reach the tolerance {:.1e} with MAX_KRONROD_LEVELS = {} '
+                      'and SCALE = {} (estimated error {:.1e})'.format(tolerance, settings.MAX_KRONROD_LEVELS, scale, error),
+                      RuntimeWarning)
+    return integral, error, evaluations
+
+
+def factor_quadrature(integrand, chunk_size=None, method=None, tolerance=None, full_output=False):
+    """Integrate a function of the systematic factor against the standard normal density.
+
+    The available integration methods are
+
+    * Riemann: fixed grid of GRID_POINTS points on [-SCALE, SCALE] (the default)
+    * Gauss-Hermite: Gauss-Hermite rule with HERMITE_POINTS nodes, refined until the tolerance is met
+    * Gauss-Kronrod: adaptive Gauss-Kronrod (7-15) rule on [-SCALE, SCALE] with controlled accuracy
+
+    The integrand is evaluated on arrays of factor values, optionally in consecutive chunks
+    of at most chunk_size points, which bounds the memory used by large integrands.
+
+    :param integrand: A function mapping an array of factor values z (first axis) to integrand values
+    :param chunk_size: The maximum number of factor values evaluated at once (optional)
+    :param method: The integration method (default settings.INTEGRATION_METHOD)
+    :param tolerance: The absolute error tolerance (default settings.PRECISION)
+    :param full_output: If True also return the error estimate and the number of integrand evaluations
+    :return: The integral (reduced over the first axis of the integrand values)
+
+    .. note:: The error estimate of the Riemann method is the difference to the rule with half the points; the method itself does not use the tolerance.
+
+    """
+    method = settings.INTEGRATION_METHOD if method is None else method
+    tolerance = settings.PRECISION if tolerance is None else tolerance
+    if method == 'Riemann':
+        integral, error, evaluations = _riemann_quadrature(integrand, chunk_size)
+    elif method == 'Gauss-Hermite':
+        integral, error, evaluations = _hermite_quadrature(integrand, chunk_size, tolerance)
+    elif method == 'Gauss-Kronrod':
+        integral, error, evaluations = _kronrod_quadrature(integrand, chunk_size, tolerance)
+    else:
+        raise ValueError('Unknown integration method: ' + str(method))
+    if full_output:
+        return integral, float(error), evaluations
+    return integral
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Integration settings that affect the numerical results (part of every cache key)
+CACHE_SETTINGS = ('GRID_POINTS', 'SCALE', 'INTEGRATION_METHOD', 'PRECISION', 'HERMITE_POINTS',
+                  'MAX_HERMITE_POINTS', 'MAX_KRONROD_LEVELS', 'BIVARIATE_NORMAL_METHOD')
+
+
+class _ResultCache(object):
+    """Size bounded (least recently used) store of Vasicek function results."""
+
+    def __init__(self):
+        self.maxsize = 0
+        self.hits = 0
+        self.misses = 0
+        self.values = OrderedDict()
+
+
+_cache = _ResultCache()
+
+
+def cache_enable(maxsize=1024):
+    """Enable the memoization of Vasicek moment and quantile functions.
+
+    Results are keyed by the function, its arguments and the active integration settings,
+    so that changing the settings never returns stale values. Calls with unhashable
+    (e.g. array) arguments are not cached.
+
+    :param maxsize: The maximum number of cached results (least recently used are evicted first)
+    """
+    _cache.maxsize = maxsize
+    while len(_cache.values) > maxsize:
+        _cache.values.popitem(last=False)
+
+
+def cache_disable():
+    """Disable the memoization of Vasicek functions and clear the cache."""
+    _cache.maxsize = 0
+    cache_clear()
+
+
+def cache_clear():
+    """Clear the cached results and reset the hit / miss counters."""
+    _cache.values.clear()
+    _cache.hits = 0
+    _cache.misses = 0
+
+
+def cache_info():
+    """Report the cache statistics.
+
+    :return: CacheInfo named tuple (hits, misses, maxsize, currsize)
+    """
+    return CacheInfo(_cache.hits, _cache.misses, _cache.maxsize, len(_cache.values))
+
+
+def _memoize(function):
+    """Decorator caching the results of a function when the cache is enabled."""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if _cache.maxsize <= 0:
+            return function(*args, **kwargs)
+        key = (function.__name__, args, tuple(sorted(kwargs.items())),
+               tuple(getattr(settings, name) for name in CACHE_SETTINGS))
+        try:
+            value = _cache.values[key]
+        except TypeError:
+            return function(*args, **kwargs)
+        except KeyError:
+            _cache.misses += 1
+            value = function(*args, **kwargs)
+            _cache.values[key] = value
+            if len(_cache.values) > _cache.maxsize:
+                _cache.values.popitem(last=False)
+            return value
+        _cache.hits += 1
+        _cache.values.move_to_end(key)
+        return value
+
+    return wrapper
+
+
+def _conditional_arg(z, p, rho):
+    """The normalized default threshold conditional on the systematic factor.
+
+    The factor values occupy the leading axes of the result and the (broadcast) p, rho the trailing axes.
+    """
+    beta = np.sqrt(rho)
+    a = stats.norm.ppf(p, loc=0.0, scale=1.0)
+    z = np.asarray(z)
+    z = z.reshape(z.shape + (1,) * np.ndim(a * beta))
+    return (a - beta * z) / np.sqrt(1 - beta * beta)
+
+
+def conditional_pd(z, p, rho):
+    """The default probability conditional on the systematic factor.
+
+    :param z: The systematic factor value(s)
+    :param p: The probability of default (scalar or array)
+    :param rho: The asset correlation (scalar or array, broadcast against p)
+    :return: The conditional probability of default with shape z.shape + broadcast(p, rho).shape
+    """
+    return stats.norm.cdf(_conditional_arg(z, p, rho), loc=0.0, scale=1.0)
+
+
+@_memoize
 def vasicek_base(N, k, p, rho):
     """Vasicek Base Discrete distribution.
 
@@ -34,23 +349,83 @@ def vasicek_base(N, k, p, rho):
     :param rho: The asset correlation parameter
     :return: The probability of k defaults
     """
+    return float(factor_quadrature(lambda z: stats.binom.pmf(k, N, conditional_pd(z, p, rho))))
 
-    zmin = - settings.SCALE
-    zmax = settings.SCALE
-    grid = settings.GRID_POINTS
 
-    beta = math.sqrt(rho)
-    dz = float(zmax - zmin) / float(grid - 1)
-    a = stats.norm.ppf(p, loc=0.0, scale=1.0)
-    integral = 0
-    for i in range(1, grid):
-        z = zmin + dz * i
-        arg = (a - beta * z) / math.sqrt(1 - beta * beta)
-        phi_den = stats.norm.pdf(z, loc=0.0, scale=1.0)
-        phi_cum = stats.norm.cdf(arg, loc=0.0, scale=1.0)
-        integrant = phi_den * math.pow(phi_cum, k) * math.pow(1 - phi_cum, N - k) * binomial(N, k)
-        integral = integral + integrant
-    return dz * integral
+def vasicek_base_pmf(N, p, rho):
+    """Vasicek Base Discrete distribution for all possible numbers of defaults.
+
+    The conditional binomial probabilities are computed in log space (log-gamma binomial
+    coefficients) so that the calculation remains stable for large portfolios. The factor
+    grid is processed in chunks of at most BLOCK_SIZE (grid point, k) elements.
+
+    :param N: The number of entities in the portfolio
+    :param p:   The probability of default (uniform across the portfolio)
+    :param rho: The asset correlation parameter
+    :return: Array with the probability of k defaults for k = 0, ..., N
+    """
+    return _vasicek_base_pmf_block(N, np.arange(N + 1), p, rho)
+
+
+def _vasicek_base_pmf_block(N, k, p, rho):
+    """Probabilities of the Vasicek Base distribution for an array of numbers of defaults k."""
+    log_binomial = special.gammaln(N + 1) - special.gammaln(k + 1) - special.gammaln(N - k + 1)
+
+    def integrand(z):
+        arg = _conditional_arg(z, p, rho)[:, np.newaxis]
+        log_pmf = log_binomial + k * special.log_ndtr(arg) + (N - k) * special.log_ndtr(-arg)
+        return np.exp(log_pmf)
+
+    chunk_size = max(1, settings.BLOCK_SIZE // len(k))
+    return factor_quadrature(integrand, chunk_size=chunk_size)
+
+
+def _vasicek_base_blocks(N, p, rho, block=64):
+    """Lazily generate the Vasicek Base distribution in consecutive (geometrically growing) blocks of k."""
+    start = 0
+    while start <= N:
+        k = np.arange(start, min(start + block, N + 1))
+        yield k, _vasicek_base_pmf_block(N, k, p, rho)
+        start = start + block
+        block = 2 * block
+
+
+def _vasicek_base_body(alpha, N, p, rho):
+    """Accumulate the Vasicek Base distribution up to the alpha quantile.
+
+    :return: Tuple of (quantile, cumulative probability at the quantile, partial mean up to the quantile)
+    """
+    cdf = 0.0
+    partial_mean = 0.0
+    for k, pmf in _vasicek_base_blocks(N, p, rho):
+        cumulative = cdf + np.cumsum(pmf)
+        i = np.searchsorted(cumulative, alpha)
+        if i < len(k):
+            partial_mean = partial_mean + np.dot(k[:i + 1], pmf[:i + 1])
+            return int(k[i]), float(cumulative[i]), float(partial_mean)
+        cdf = cumulative[-1]
+        partial_mean = partial_mean + np.dot(k, pmf)
+    # numerical mass short of alpha: the quantile is the full portfolio
+    return N, float(cdf), float(partial_mean)
+
+
+def _joint_default_probability(p, rho, analytic=False):
+    """The probability of joint default of two entities (the second moment of the conditional PD).
+
+    In analytic mode the identity E[Phi(..)^2] = Phi_2(a, a; rho) with a = Ninv(p) is used, with the
+    bivariate normal method settings.BIVARIATE_NORMAL_METHOD (the default Genz method keeps its
+    relative accuracy also in the deep tail of very small p).
+    Otherwise the factor grid is processed in chunks so that at most BLOCK_SIZE values are held at once.
+    """
+    if analytic:
+        if np.ndim(p) == 0 and np.ndim(rho) == 0:
+            # single value: skip the broadcasting of the array arguments
+            a = special.ndtri(float(p))
+            return float(bv.BivariateNormalDistributionArray(a, a, float(rho)))
+        a = special.ndtri(p)
+        return bv.BivariateNormalDistributionArray(a, a, rho)
+    chunk_size = max(1, settings.BLOCK_SIZE // np.broadcast(p, rho).size)
+    return factor_quadrature(lambda z: np.square(conditional_pd(z, p, rho)), chunk_size=chunk_size)
 
 
 def vasicek_base_el(N, p, rho):
@@ -64,46 +439,76 @@ def vasicek_base_el(N, p, rho):
     return N * p
 
 
-def vasicek_base_ul(N, p, rho):
+@_memoize
+def vasicek_base_ul(N, p, rho, analytic=False):
     """Unexpected Loss (Standard Deviation) for the Vasicek Base distribution.
 
+    All arguments broadcast against each other like NumPy ufuncs.
+
     :param N: The number of entities in the portfolio
     :param p: The probability of default
     :param rho: The asset correlation
+    :param analytic: If True use the closed form bivariate normal expression instead of numerical integration
     :return: The default rate volatility (UL)
     """
-    zmin = - settings.SCALE
-    zmax = settings.SCALE
-    grid = settings.GRID_POINTS
+    N = np.asarray(N, dtype=float)
+    p = np.asarray(p, dtype=float)
+    integral = _joint_default_probability(p, rho, analytic=analytic)
+    result = p / N - p * p + (N - 1) / N * integral
+    return N * np.sqrt(result)
 
-    beta = math.sqrt(rho)
-    dz = float(zmax - zmin) / float(grid - 1)
-    a = stats.norm.ppf(p, loc=0.0, scale=1.0)
-    integral = 0
-    for i in range(1, grid):
-        z = zmin + dz * i
-        arg = (a - beta * z) / math.sqrt(1 - beta * beta)
-        phi_den = stats.norm.pdf(z, loc=0.0, scale=1.0)
-        phi_cum = stats.norm.cdf(arg, loc=0.0, scale=1.0)
-        integrant = phi_den * math.pow(phi_cum, 2)
-        integral = integral + integrant
-    result = p / N - p * p + float(N - 1) / float(N) * dz * integral
-    return N * math.sqrt(result)
+
+@_memoize
+def vasicek_base_quantile(alpha, N, p, rho):
+    """The quantile (Value-at-Risk) of the Vasicek Base distribution.
+
+    The cumulative distribution is built lazily in blocks of k and the calculation stops
+    as soon as the requested confidence level is reached.
+
+    :param alpha: The desired quantile
+    :param N: The number of entities in the portfolio
+    :param p: The probability of default
+    :param rho: The asset correlation
+    :return: The smallest number of defaults k with cumulative probability at least alpha
+    """
+    quantile, cdf, partial_mean = _vasicek_base_body(alpha, N, p, rho)
+    return quantile
+
+
+@_memoize
+def vasicek_base_es(alpha, N, p, rho):
+    """The expected shortfall of the Vasicek Base distribution.
+
+    The tail expectation is obtained from the mean of the distribution and the lazily
+    accumulated body up to the quantile. Atoms at the quantile are weighted so that the
+    tail has exactly probability 1 - alpha (Acerbi-Tasche definition).
+
+    :param alpha: The desired confidence level
+    :param N: The number of entities in the portfolio
+    :param p: The probability of default
+    :param rho: The asset correlation
+    :return: The expected number of defaults beyond the alpha quantile
+    """
+    quantile, cdf, partial_mean = _vasicek_base_body(alpha, N, p, rho)
+    mean = N * factor_quadrature(lambda z: conditional_pd(z, p, rho))
+    return (mean - partial_mean + quantile * (cdf - alpha)) / (1 - alpha)
 
 
 def vasicek_lim(theta, p, rho):
     """The Large-N limit of the Vasicek Distribution.
 
+    All arguments broadcast against each other like NumPy ufuncs.
+
     :param theta: The target default rate
     :param p:   The probability of default
     :param rho: The asset correlation
     :return: Cumulative probability
     """
 
-    beta = math.sqrt(rho)
+    beta = np.sqrt(rho)
     a1 = stats.norm.ppf(p, loc=0.0, scale=1.0)
     arg1 = stats.norm.ppf(theta, loc=0.0, scale=1.0)
-    arg2 = (math.sqrt(1 - beta * beta) * arg1 - a1) / beta
+    arg2 = (np.sqrt(1 - beta * beta) * arg1 - a1) / beta
     result = stats.norm.cdf(arg2, loc=0.0, scale=1.0)
     return result
 
@@ -118,43 +523,101 @@ def vasicek_lim_el(p, rho):
     return p
 
 
-def vasicek_lim_ul(p, rho):
+@_memoize
+def vasicek_lim_ul(p, rho, analytic=False):
     """The unexpected loss of the large n limit of the Vasicek distribution.
 
+    All arguments broadcast against each other like NumPy ufuncs.
+
     :param p:  The probability of default
     :param rho: The asset correlation
+    :param analytic: If True use the closed form bivariate normal expression instead of numerical integration
     :return: The default rate volatility
     """
-    zmin = - settings.SCALE
-    zmax = settings.SCALE
-    grid = settings.GRID_POINTS
-    beta = math.sqrt(rho)
-
-    dz = float(zmax - zmin) / float(grid - 1)
-    a = stats.norm.ppf(p, loc=0.0, scale=1.0)
-    integral = 0
-    for i in range(1, grid):
-        z = zmin + dz * i
-        arg = (a - beta * z) / math.sqrt(1 - beta * beta)
-        phi_den = stats.norm.pdf(z, loc=0.0, scale=1.0)
-        phi_cum = stats.norm.cdf(arg, loc=0.0, scale=1.0)
-        integrant = phi_den * math.pow(phi_cum, 2)
-        integral = integral + integrant
-    result = - p * p + dz * integral
-    return math.sqrt(result)
+    p = np.asarray(p, dtype=float)
+    integral = _joint_default_probability(p, rho, analytic=analytic)
+    result = - p * p + integral
+    return np.sqrt(result)
 
 
+@_memoize
 def vasicek_lim_q(alpha, p, rho):
     """The quantile of the large-n Limit of the Vasicek distribution.
 
+    All arguments broadcast against each other like NumPy ufuncs.
+
     :param alpha: The desired quantile
     :param p:   The probability of default
     :param rho: The asset correlation
     :return:  The default rate at that confidence level
     """
-    beta = math.sqrt(rho)
+    beta = np.sqrt(rho)
 
     a1 = stats.norm.ppf(p, loc=0.0, scale=1.0)
     a2 = stats.norm.ppf(alpha, loc=0.0, scale=1.0)
-    arg = (a1 + beta * a2) / math.sqrt(1 - beta * beta)
+    arg = (a1 + beta * a2) / np.sqrt(1 - beta * beta)
     return stats.norm.cdf(arg, loc=0.0, scale=1.0)
+
+
+def _joint_default_sensitivities(p, rho):
+    """Derivatives of the joint default probability Phi_2(a, a; rho), a = Ninv(p), with respect to p and rho."""
+    a = stats.norm.ppf(p, loc=0.0, scale=1.0)
+    d_p = 2.0 * stats.norm.cdf(a * np.sqrt((1 - rho) / (1 + rho)), loc=0.0, scale=1.0)
+    d_rho = np.exp(- a * a / (1 + rho)) / (2.0 * math.pi * np.sqrt(1 - rho * rho))
+    return d_p, d_rho
+
+
+def vasicek_lim_q_greeks(alpha, p, rho):
+    """The quantile of the large-n Limit of the Vasicek distribution and its sensitivities.
+
+    All arguments broadcast against each other like NumPy ufuncs.
+
+    :param alpha: The desired quantile
+    :param p:   The probability of default
+    :param rho: The asset correlation
+    :return: Tuple of (quantile, derivative with respect to p, derivative with respect to rho)
+    """
+    beta = np.sqrt(rho)
+    a1 = stats.norm.ppf(p, loc=0.0, scale=1.0)
+    a2 = stats.norm.ppf(alpha, loc=0.0, scale=1.0)
+    arg = (a1 + beta * a2) / np.sqrt(1 - rho)
+    density = stats.norm.pdf(arg, loc=0.0, scale=1.0)
+    d_p = density / (np.sqrt(1 - rho) * stats.norm.pdf(a1, loc=0.0, scale=1.0))
+    d_rho = density * (a2 / (2.0 * beta * np.sqrt(1 - rho)) + arg / (2.0 * (1 - rho)))
+    return stats.norm.cdf(arg, loc=0.0, scale=1.0), d_p, d_rho
+
+
+def vasicek_lim_ul_greeks(p, rho, analytic=False):
+    """The unexpected loss of the large n limit of the Vasicek distribution and its sensitivities.
+
+    All arguments broadcast against each other like NumPy ufuncs.
+
+    :param p:  The probability of default
+    :param rho: The asset correlation
+    :param analytic: If True use the closed form bivariate normal expression for the value
+    :return: Tuple of (default rate volatility, derivative with respect to p, derivative with respect to rho)
+    """
+    p = np.asarray(p, dtype=float)
+    ul = vasicek_lim_ul(p, rho, analytic=analytic)
+    d_p, d_rho = _joint_default_sensitivities(p, rho)
+    return ul, (d_p - 2.0 * p) / (2.0 * ul), d_rho / (2.0 * ul)
+
+
+def vasicek_base_ul_greeks(N, p, rho, analytic=False):
+    """Unexpected Loss (Standard Deviation) for the Vasicek Base distribution and its sensitivities.
+
+    All arguments broadcast against each other like NumPy ufuncs.
+
+    :param N: The number of entities in the portfolio
+    :param p: The probability of default
+    :param rho: The asset correlation
+    :param analytic: If True use the closed form bivariate normal expression for the value
+    :return: Tuple of (default rate volatility, derivative with respect to p, derivative with respect to rho)
+    """
+    N = np.asarray(N, dtype=float)
+    p = np.asarray(p, dtype=float)
+    ul = vasicek_base_ul(N, p, rho, analytic=analytic)
+    d_p, d_rho = _joint_default_sensitivities(p, rho)
+    d_p = 1.0 / N - 2.0 * p + (N - 1) / N * d_p
+    d_rho = (N - 1) / N * d_rho
+    return ul, N * N * d_p / (2.0 * ul), N * N * d_rho / (2.0 * ul)
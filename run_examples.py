@@ -23,7 +23,7 @@ examples_path = os.path.join("examples", "python")
 # filelist = ['loss_distributions', 'portfolio_model']
 
 filelist = ['loss_distributions', 'calculate_variance', 'calculate_thresholds', 'portfolio_model',
-            'validate_thresholds', 'visualize_thresholds']
+            'validate_thresholds', 'visualize_thresholds', 'bivariate_normal_benchmark']
 
 if __name__ == '__main__':
 
@@ -0,0 +1,48 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk, all rights reserved
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from portfolioAnalytics import capital
+from portfolioAnalytics import vasicek as va
+from portfolioAnalytics.utils.portfolio import Portfolio
+
+ACCURATE_DIGITS = 4
+
+
+class TestASRFCapital(unittest.TestCase):
+    '''
+    Basel IRB capital calculation
+    '''
+
+    def test_risk_weight(self):
+        # Basel II corporate risk weight for PD 1%, LGD 45%, M 2.5
+        P = Portfolio(1, [0.01], [100.0], [0])
+        result = capital.asrf_capital(P)
+        self.assertAlmostEqual(result['total_rwa'], 92.3168, places=ACCURATE_DIGITS)
+
+    def test_segments(self):
+        P = Portfolio(4, [0.01, 0.02, 0.05, 0.0001], [10.0, 20.0, 30.0, 40.0], [0, 1, 0, 1],
+                      lgd=[0.45, 0.25, 0.45, 0.75], maturity=[1.0, 2.5, 5.0, 2.5])
+        result = capital.asrf_capital(P, correlation=0.15)
+        self.assertAlmostEqual(result['conditional_pd'][1], va.vasicek_lim_q(0.999, 0.02, 0.15), places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(result['segments'][0]['capital'] + result['segments'][1]['capital'],
+                               result['total_capital'], places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(result['segments'][0]['exposure'], 40.0, places=ACCURATE_DIGITS)
+        # the PD floor applies to the last loan
+        self.assertAlmostEqual(result['conditional_pd'][3], va.vasicek_lim_q(0.999, capital.PD_FLOOR, 0.15), places=ACCURATE_DIGITS)
+
+
+if __name__ == "__main__":
+    unittest.main()
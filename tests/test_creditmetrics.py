@@ -0,0 +1,155 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk, all rights reserved
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from portfolioAnalytics import creditmetrics as cm
+from portfolioAnalytics.utils import bivariatenormal as bv
+from portfolioAnalytics.utils.portfolio import Portfolio
+
+ACCURATE_DIGITS = 7
+
+
+def reference_variance(portfolio, correlation, loadings):
+    """Pair by pair variance calculation (with the Owen's T bivariate normal)."""
+    result = 0.0
+    for i in range(portfolio.psize):
+        p1 = portfolio.rating[i]
+        result += portfolio.exposure[i] ** 2 * (p1 - p1 * p1)
+        for j in range(i):
+            p2 = portfolio.rating[j]
+            rho = loadings[portfolio.factor[i]] * loadings[portfolio.factor[j]] * correlation[portfolio.factor[i]][portfolio.factor[j]]
+            result += 2 * portfolio.exposure[i] * portfolio.exposure[j] * (
+                bv.BivariateNormalDistributionArray(cm.Ninv(p1), cm.Ninv(p2), rho, method='OwensT') - p1 * p2)
+    return result
+
+
+class TestCreditMetricsVariance(unittest.TestCase):
+    '''
+    Credit Metrics style variance calculation
+    '''
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 60
+        self.portfolio = Portfolio(n, list(rng.choice([0.001, 0.005, 0.01, 0.02, 0.05, 0.1], n)),
+                                   list(rng.uniform(1, 100, n)), list(rng.integers(0, 3, n)))
+        self.correlation = [[1.0, 0.2, 0.3], [0.2, 1.0, 0.25], [0.3, 0.25, 1.0]]
+        self.loadings = [0.3, 0.4, 0.5]
+        self.expected = reference_variance(self.portfolio, self.correlation, self.loadings)
+
+    def test_variance(self):
+        result = cm.variance(self.portfolio, self.correlation, self.loadings)
+        self.assertAlmostEqual(result / self.expected, 1.0, places=ACCURATE_DIGITS)
+
+    def test_variance_bucketed(self):
+        result = cm.variance(self.portfolio, self.correlation, self.loadings, method='Bucketed')
+        self.assertAlmostEqual(result / self.expected, 1.0, places=ACCURATE_DIGITS)
+        self.assertRaises(ValueError, cm.variance, self.portfolio, self.correlation, self.loadings, method='Unknown')
+
+    def test_variance_hermite(self):
+        result, error = cm.variance(self.portfolio, self.correlation, self.loadings, method='Hermite', order=30,
+                                    full_output=True)
+        self.assertAlmostEqual(result / self.expected, 1.0, places=6)
+        for order in [1, 3, 6]:
+            result, error = cm.variance(self.portfolio, self.correlation, self.loadings, method='Hermite', order=order,
+                                        full_output=True)
+            self.assertLessEqual(abs(result - self.expected), error)
+
+    def test_obligor_netting(self):
+        # two loans of obligor 7 default together: the variance is the one of the obligor (exposure 30)
+        loans = Portfolio(3, [0.02, 0.02, 0.01], [10.0, 20.0, 40.0], [0, 0, 1], obligor=[7, 7, 8])
+        obligors = Portfolio(2, [0.02, 0.01], [30.0, 40.0], [0, 1])
+        expected = reference_variance(obligors, self.correlation, self.loadings)
+        for method in ['Pairwise', 'Bucketed']:
+            self.assertAlmostEqual(cm.variance(loans, self.correlation, self.loadings, method=method) / expected, 1.0,
+                                   places=ACCURATE_DIGITS)
+        result = cm.risk_contributions(loans, self.correlation, self.loadings)
+        self.assertEqual(len(result['contributions']), 2)
+        self.assertAlmostEqual(result['variance'] / expected, 1.0, places=ACCURATE_DIGITS)
+
+    def test_variance_truncated(self):
+        result = cm.variance(self.portfolio, self.correlation, self.loadings, method='Truncated', tolerance=0.0)
+        self.assertAlmostEqual(result / self.expected, 1.0, places=ACCURATE_DIGITS)
+        for tolerance in [0.1, 1.0, 10.0]:
+            result, error = cm.variance(self.portfolio, self.correlation, self.loadings, method='Truncated',
+                                        tolerance=tolerance, full_output=True)
+            self.assertLessEqual(abs(result - self.expected), error)
+
+    def test_variance_blocked(self):
+        result = cm.variance(self.portfolio, self.correlation, self.loadings, method='Blocked', workers=2)
+        self.assertAlmostEqual(result / self.expected, 1.0, places=ACCURATE_DIGITS)
+
+
+class TestRiskContributions(unittest.TestCase):
+    '''
+    Euler allocation of the Credit Metrics Loss Volatility
+    '''
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        n = 30
+        self.portfolio = Portfolio(n, list(rng.choice([0.005, 0.02, 0.1], n)), list(rng.uniform(1, 100, n)),
+                                   list(rng.integers(0, 2, n)))
+        self.correlation = [[1.0, 0.3], [0.3, 1.0]]
+        self.loadings = [0.4, 0.5]
+
+    def test_contributions(self):
+        expected = reference_variance(self.portfolio, self.correlation, self.loadings)
+        # finite difference derivative of the loss volatility with respect to the first exposure
+        h = 1e-4
+        bumped = Portfolio(self.portfolio.psize, self.portfolio.rating, [self.portfolio.exposure[0] + h] + self.portfolio.exposure[1:],
+                           self.portfolio.factor)
+        derivative = (np.sqrt(reference_variance(bumped, self.correlation, self.loadings)) - np.sqrt(expected)) / h
+        for method in ['Pairwise', 'Bucketed']:
+            result = cm.risk_contributions(self.portfolio, self.correlation, self.loadings, method=method)
+            self.assertAlmostEqual(result['variance'] / expected, 1.0, places=ACCURATE_DIGITS)
+            self.assertAlmostEqual(np.sum(result['contributions']) / result['ul'], 1.0, places=ACCURATE_DIGITS)
+            self.assertAlmostEqual(sum(result['factors'].values()) / result['ul'], 1.0, places=ACCURATE_DIGITS)
+            self.assertAlmostEqual(sum(result['ratings'].values()) / result['ul'], 1.0, places=ACCURATE_DIGITS)
+            self.assertAlmostEqual(result['marginal'][0], derivative, places=4)
+
+
+class TestVarianceAccumulator(unittest.TestCase):
+    '''
+    Incremental Credit Metrics variance
+    '''
+
+    def test_accumulator(self):
+        rng = np.random.default_rng(2)
+        n = 40
+        rating = rng.choice([0.001, 0.01, 0.05], n)
+        exposure = rng.uniform(1, 100, n)
+        factor = rng.integers(0, 2, n)
+        correlation = [[1.0, 0.3], [0.3, 1.0]]
+        loadings = [0.4, 0.5]
+        amended = exposure.copy()
+        amended[25] = 5.0
+        expected = reference_variance(Portfolio(30, rating[10:], amended[10:], factor[10:]), correlation, loadings)
+        for method in ['Pairwise', 'Bucketed']:
+            accumulator = cm.VarianceAccumulator(Portfolio(30, rating[:30], exposure[:30], factor[:30]), correlation, loadings,
+                                                 method=method)
+            for i in range(30, n):
+                self.assertEqual(accumulator.add(rating[i], exposure[i], factor[i]), i)
+            for i in range(10):
+                accumulator.remove(i)
+            accumulator.update_exposure(25, 5.0)
+            self.assertAlmostEqual(accumulator.variance() / expected, 1.0, places=ACCURATE_DIGITS)
+            self.assertAlmostEqual(accumulator.creditmetrics_ul() ** 2 / expected, 1.0, places=ACCURATE_DIGITS)
+
+
+if __name__ == "__main__":
+    unittest.main()
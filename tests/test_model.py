@@ -15,14 +15,29 @@
 
 import unittest
 
+import portfolioAnalytics.vasicek as va
+from portfolioAnalytics.model import LossDistribution
+from portfolioAnalytics.utils.portfolio import Portfolio
+
 ACCURATE_DIGITS = 7
 
 
-class LossDistribution(unittest.TestCase):
+class TestLossDistribution(unittest.TestCase):
 
     def test_calculate(self):
         pass
 
+    def test_calculate_montecarlo(self):
+        n = 50
+        P = Portfolio(n, [0.02] * n, [1.0] * n, [0] * n)
+        M = LossDistribution()
+        M.calculate(method='MonteCarlo', portfolio=P, correlation=[[1.0]], loadings=[0.2 ** 0.5], scenarios=50000,
+                    confidence=[0.99], seed=1)
+        self.assertAlmostEqual(M.mean[0], 1.0, places=1)
+        self.assertAlmostEqual(M.stddev[0] / va.vasicek_base_ul(n, 0.02, 0.2), 1.0, places=1)
+        self.assertEqual(M.quantiles[0.99][0], va.vasicek_base_quantile(0.99, n, 0.02, 0.2))
+        self.assertEqual(M.quantile(0.995), va.vasicek_base_quantile(0.995, n, 0.02, 0.2))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,169 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk, all rights reserved
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from portfolioAnalytics import creditmetrics as cm
+from portfolioAnalytics import montecarlo as mc
+from portfolioAnalytics import vasicek as va
+from portfolioAnalytics.utils.portfolio import Portfolio
+
+ACCURATE_DIGITS = 7
+
+
+class TestMonteCarlo(unittest.TestCase):
+    '''
+    Monte Carlo simulation of the portfolio loss
+    '''
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 40
+        self.portfolio = Portfolio(n, list(rng.choice([0.01, 0.02, 0.05], n)), list(rng.uniform(1, 10, n)),
+                                   list(rng.integers(0, 2, n)))
+        self.correlation = [[1.0, 0.3], [0.3, 1.0]]
+        self.loadings = [0.4, 0.5]
+
+    def test_moments(self):
+        result = mc.loss_statistics(self.portfolio, self.correlation, self.loadings, scenarios=50000, batch_size=7000,
+                                    seed=3)
+        mean = np.dot(self.portfolio.rating, self.portfolio.exposure)
+        ul = np.sqrt(cm.variance(self.portfolio, self.correlation, self.loadings, method='Bucketed'))
+        self.assertEqual(result['scenarios'], 50000)
+        self.assertLess(abs(result['mean'] - mean), 4 * ul / np.sqrt(50000))
+        self.assertAlmostEqual(result['ul'] / ul, 1.0, places=1)
+        self.assertGreaterEqual(result['es'][0.99], result['var'][0.99])
+        self.assertGreaterEqual(result['var'][0.999], result['var'][0.99])
+
+    def test_obligor_netting(self):
+        # facilities of one obligor are simulated as a single default event
+        loans = Portfolio(3, [0.02, 0.02, 0.01], [10.0, 20.0, 40.0], [0, 0, 1], obligor=[7, 7, 8])
+        obligors = Portfolio(2, [0.02, 0.01], [30.0, 40.0], [0, 1])
+        first = mc.loss_statistics(loans, self.correlation, self.loadings, scenarios=2000, seed=5)
+        second = mc.loss_statistics(obligors, self.correlation, self.loadings, scenarios=2000, seed=5)
+        self.assertEqual(first['var'], second['var'])
+        self.assertEqual(first['ul'], second['ul'])
+
+    def test_batches(self):
+        # the batch size does not change the moments
+        first = mc.loss_statistics(self.portfolio, self.correlation, self.loadings, scenarios=1000, batch_size=1000,
+                                   seed=4)
+        losses = np.concatenate(list(mc.simulate_losses(self.portfolio, self.correlation, self.loadings, scenarios=1000,
+                                                        batch_size=1000, seed=4)))
+        self.assertAlmostEqual(first['mean'], np.mean(losses), places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(first['ul'], np.std(losses), places=ACCURATE_DIGITS)
+        moments = mc.LossMoments()
+        for batch in np.array_split(losses, 7):
+            moments.update(batch)
+        self.assertAlmostEqual(moments.variance(), np.var(losses), places=ACCURATE_DIGITS)
+
+    def test_tail_statistics(self):
+        summary = mc.LossSummary()
+        summary.update(np.arange(1.0, 101.0))
+        result = summary.statistics([0.95])
+        self.assertEqual(result['var'][0.95], 95.0)
+        self.assertAlmostEqual(result['es'][0.95], 98.0, places=ACCURATE_DIGITS)
+
+
+class TestParallelMonteCarlo(unittest.TestCase):
+    '''
+    Parallel simulation with mergeable loss summaries
+    '''
+
+    def test_summary(self):
+        losses = np.random.default_rng(5).integers(0, 50, 10000).astype(float)
+        whole = mc.LossSummary()
+        whole.update(losses)
+        merged = mc.LossSummary()
+        for batch in np.array_split(losses, 3):
+            part = mc.LossSummary()
+            part.update(batch)
+            merged.merge(part)
+        result = merged.statistics([0.95])
+        self.assertEqual(result['var'], whole.statistics([0.95])['var'])
+        self.assertAlmostEqual(result['ul'], whole.statistics([0.95])['ul'], places=ACCURATE_DIGITS)
+        # sample VaR and (Acerbi-Tasche) expected shortfall
+        ordered = np.sort(losses)
+        quantile = ordered[int(np.ceil(0.95 * len(losses))) - 1]
+        shortfall = (np.sum(ordered[ordered > quantile]) / len(losses) + quantile * (np.mean(ordered <= quantile) - 0.95)) / 0.05
+        self.assertEqual(result['var'][0.95], quantile)
+        self.assertAlmostEqual(result['es'][0.95], shortfall, places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(result['mean'], np.mean(losses), places=ACCURATE_DIGITS)
+        self.assertRaises(ValueError, merged.merge, mc.LossSummary(accuracy=0.1))
+
+    def test_reproducible(self):
+        n = 50
+        P = Portfolio(n, [0.02] * n, [1.0] * n, [0] * n)
+        first = mc.loss_statistics(P, [[1.0]], [0.5], scenarios=3000, seed=11, workers=2)
+        second = mc.loss_statistics(P, [[1.0]], [0.5], scenarios=3000, seed=11, workers=2)
+        self.assertEqual(first['var'], second['var'])
+        self.assertEqual(first['mean'], second['mean'])
+        self.assertEqual(first['scenarios'], 3000)
+        self.assertLess(abs(first['mean'] - 1.0), 0.2)
+
+
+class TestQuasiMonteCarlo(unittest.TestCase):
+    '''
+    Scrambled Sobol sampling of the systematic factors
+    '''
+
+    def test_sobol(self):
+        n = 200
+        P = Portfolio(n, [0.01] * n, [1.0] * n, [0] * n)
+        pseudo = mc.loss_statistics(P, [[1.0]], [0.5], scenarios=4000, confidence=[0.99], seed=1, randomizations=8)
+        sobol = mc.loss_statistics(P, [[1.0]], [0.5], scenarios=4000, confidence=[0.99], seed=1, sampling='Sobol')
+        # 8 randomizations of 512 points
+        self.assertEqual(sobol['scenarios'], 4096)
+        self.assertEqual(sobol['replications'], 8)
+        self.assertLess(sobol['error']['mean'], pseudo['error']['mean'])
+        self.assertLess(abs(sobol['mean'] - 2.0), 4 * sobol['error']['mean'])
+        # the VaR is a single quantile of all randomizations (a possible number of defaults)
+        self.assertEqual(sobol['var'][0.99], round(sobol['var'][0.99]))
+        self.assertEqual(sobol['var'][0.99], sobol['sketch'].quantile(0.99))
+        self.assertGreater(sobol['error']['var'][0.99], 0.0)
+        self.assertIsNone(mc.loss_statistics(P, [[1.0]], [0.5], scenarios=100, seed=1)['error'])
+        self.assertRaises(ValueError, mc.loss_statistics, P, [[1.0]], [0.5], sampling='Unknown')
+
+
+class TestImportanceSampling(unittest.TestCase):
+    '''
+    Importance sampling of the tail of the portfolio loss
+    '''
+
+    def test_homogeneous(self):
+        n = 100
+        P = Portfolio(n, [0.01] * n, [1.0] * n, [0] * n)
+        shift, threshold = mc.importance_shift(P, [[1.0]], [0.2 ** 0.5], alpha=0.9997)
+        self.assertLess(shift[0], 0.0)
+        expected = va.vasicek_base_quantile(0.9997, n, 0.01, 0.2)
+        for importance in mc.IMPORTANCE_METHODS:
+            result = mc.loss_statistics(P, [[1.0]], [0.2 ** 0.5], scenarios=5000, confidence=[0.9997], seed=1,
+                                        importance=importance)
+            self.assertLessEqual(abs(result['var'][0.9997] - expected), 1.0)
+            self.assertAlmostEqual(result['es'][0.9997] / va.vasicek_base_es(0.9997, n, 0.01, 0.2), 1.0, places=1)
+            self.assertGreater(result['variance_reduction'][0.9997], 10.0)
+            self.assertLess(result['ess'], result['scenarios'])
+            # the mean and loss volatility are exact (not likelihood ratio weighted estimates)
+            self.assertAlmostEqual(result['mean'], va.vasicek_base_el(n, 0.01, 0.2), places=ACCURATE_DIGITS)
+            self.assertAlmostEqual(result['ul'] / va.vasicek_base_ul(n, 0.01, 0.2), 1.0, places=5)
+        self.assertRaises(ValueError, mc.loss_statistics, P, [[1.0]], [0.5], importance='Unknown')
+        summary = mc.LossSummary()
+        summary.update([1.0, 2.0], [0.5, 1.5])
+        self.assertIsNone(summary.statistics([0.9])['mean'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk, all rights reserved
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from portfolioAnalytics import tables
+from portfolioAnalytics import vasicek as va
+
+ACCURATE_DIGITS = 7
+
+
+class TestLookupTable(unittest.TestCase):
+    '''
+    Precomputed Vasicek lookup tables
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'lim_q.tbl')
+        self.table = tables.generate_table(self.filename, 'vasicek_lim_q',
+                                           [[0.99, 0.995, 0.999], np.geomspace(1e-4, 0.5, 100), np.linspace(0.01, 0.5, 50)],
+                                           workers=2)
+
+    def tearDown(self):
+        del self.table
+        self.directory.cleanup()
+
+    def test_nodes(self):
+        p = self.table.axes[1][17]
+        self.assertAlmostEqual(self.table(0.999, p, 0.01), va.vasicek_lim_q(0.999, p, 0.01), places=ACCURATE_DIGITS)
+
+    def test_error_bound(self):
+        rng = np.random.default_rng(0)
+        alpha = rng.choice([0.99, 0.995, 0.999], 1000)
+        p = rng.uniform(1e-4, 0.5, 1000)
+        rho = rng.uniform(0.01, 0.5, 1000)
+        error = np.abs(self.table(alpha, p, rho) - va.vasicek_lim_q(alpha, p, rho))
+        self.assertLessEqual(np.max(error), self.table.abs_error_estimate)
+        self.assertAlmostEqual(self.table(alpha[0], p[0], rho[0]), self.table(alpha, p, rho)[0], places=ACCURATE_DIGITS)
+        self.assertRaises(ValueError, self.table, 0.999, 0.6, 0.1)
+
+    def test_error_bound_face_midpoints(self):
+        # the (p, rho) curvature terms have opposite signs, the largest errors are on the cell faces
+        filename = os.path.join(self.directory.name, 'lim_ul.tbl')
+        table = tables.generate_table(filename, 'vasicek_lim_ul', [np.geomspace(1e-4, 0.5, 20), np.linspace(0.01, 0.5, 10)],
+                                      workers=1)
+        rng = np.random.default_rng(1)
+        p = rng.uniform(1e-4, 0.5, 4000)
+        rho = rng.uniform(0.01, 0.5, 4000)
+        error = np.abs(table(p, rho) - va.vasicek_lim_ul(p, rho))
+        self.assertLessEqual(np.max(error), table.abs_error_estimate)
+        del table
+
+    def test_version(self):
+        with open(self.filename, 'rb') as f:
+            data = bytearray(f.read())
+        data[len(tables.MAGIC):len(tables.MAGIC) + 4] = struct.pack('<I', tables.VERSION + 1)
+        filename = os.path.join(self.directory.name, 'other.tbl')
+        with open(filename, 'wb') as f:
+            f.write(data)
+        self.assertRaises(ValueError, tables.LookupTable, filename)
+
+    def test_load_without_scipy(self):
+        code = "import sys; from portfolioAnalytics.tables import LookupTable; " \
+               "LookupTable(sys.argv[1])(0.999, 0.01, 0.2); print('scipy' in sys.modules)"
+        output = subprocess.check_output([sys.executable, '-c', code, self.filename])
+        self.assertEqual(output.strip(), b'False')
+
+
+if __name__ == "__main__":
+    unittest.main()
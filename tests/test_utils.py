@@ -14,6 +14,12 @@
 
 import unittest
 
+import numpy as np
+
+from portfolioAnalytics.utils import bivariatenormal as bv
+from portfolioAnalytics.utils.portfolio import Portfolio
+from portfolioAnalytics.utils.sketch import QuantileSketch
+
 ACCURATE_DIGITS = 7
 
 
@@ -22,6 +28,105 @@ class TestBivariateNormal(unittest.TestCase):
     def test_bivariate_normal_distribution(self):
         pass
 
+    def test_bivariate_normal_array(self):
+        rng = np.random.default_rng(0)
+        a = np.concatenate([rng.normal(0, 2, 500), [0.0, 0.0, 1.0, -1.0, 0.5, -0.5, 0.0]])
+        b = np.concatenate([rng.normal(0, 2, 500), [0.0, 1.0, 0.0, 0.3, -0.5, 0.5, 0.4]])
+        rho = np.concatenate([rng.uniform(-1, 1, 500), [0.5, -0.5, 1.0, -1.0, 0.0, 0.9, 0.0]])
+        values = bv.BivariateNormalDistributionArray(a, b, rho)
+        for i in range(len(a)):
+            self.assertAlmostEqual(values[i], bv.BivariateNormalDistribution(a[i], b[i], rho[i]), places=ACCURATE_DIGITS)
+        self.assertEqual(bv.BivariateNormalDistributionArray(a[:6].reshape(2, 3), 0.0, 0.5).shape, (2, 3))
+
+    def test_bivariate_normal_methods(self):
+        # high precision reference values
+        a = np.array([-3.0, 0.7, 0.0, 1.5, -1.2, 2.0])
+        b = np.array([3.0, 0.4, 0.4, -2.0, -1.0, 2.5])
+        rho = np.array([-0.95, 0.93, 0.0, -0.5, 0.999, 0.3])
+        expected = np.array([0.00054073468519415884, 0.63993339418519362922, 0.32771087080516208746,
+                             0.014546630287190704671, 0.11506966247320210582, 0.97175053870294239666])
+        for method in ['Drezner', 'Genz', 'OwensT']:
+            values = bv.BivariateNormalDistributionArray(a, b, rho, method=method)
+            for i in range(len(a)):
+                self.assertAlmostEqual(values[i], expected[i], places=ACCURATE_DIGITS)
+        self.assertRaises(ValueError, bv.BivariateNormalDistributionArray, a, b, rho, method='Unknown')
+        # single values (one branch of each method)
+        for method in ['Drezner', 'Genz', 'OwensT']:
+            for i in range(len(a)):
+                value = bv.BivariateNormalDistributionArray(a[i], b[i], rho[i], method=method)
+                self.assertEqual(np.shape(value), ())
+                self.assertAlmostEqual(float(value), expected[i], places=ACCURATE_DIGITS)
+
+
+class TestPortfolio(unittest.TestCase):
+
+    def test_net_obligors(self):
+        data = [{"ID": "1", "OBLIGOR": "B", "PD": "0.02", "EAD": "10", "FACTOR": 1, "LGD": "0.5"},
+                {"ID": "2", "OBLIGOR": "A", "PD": "0.01", "EAD": "40", "FACTOR": 0, "LGD": "0.4"},
+                {"ID": "3", "OBLIGOR": "B", "PD": "0.02", "EAD": "30", "FACTOR": 1, "LGD": "0.3"}]
+        P = Portfolio()
+        P.loadjson(data)
+        self.assertEqual(P.preprocess_portfolio()[0], 2)
+        Q = P.net_obligors()
+        self.assertEqual(Q.psize, 2)
+        self.assertEqual(Q.obligor, ['B', 'A'])
+        self.assertEqual(Q.exposure, [40.0, 40.0])
+        self.assertEqual(Q.rating, [0.02, 0.01])
+        self.assertEqual(Q.factor, [1, 0])
+        self.assertAlmostEqual(Q.lgd[0], 0.35, places=ACCURATE_DIGITS)
+        # a fresh portfolio does not share the data of the previous one
+        self.assertEqual(Portfolio().exposure, [])
+
+    def test_loadjson_optional_fields(self):
+        data = [{"ID": "1", "PD": "0.02", "EAD": "10", "FACTOR": 0, "LGD": "0.5"},
+                {"ID": "2", "PD": "0.01", "EAD": "40", "FACTOR": 0},
+                {"ID": "3", "PD": "0.02", "EAD": "30", "FACTOR": 0, "LGD": "0.3"}]
+        P = Portfolio()
+        self.assertRaises(ValueError, P.loadjson, data)
+        self.assertEqual(P.exposure, [])
+        data[1]['LGD'] = "0.4"
+        P.loadjson(data)
+        self.assertEqual(P.lgd, [0.5, 0.4, 0.3])
+        data[0]['OBLIGOR'] = "A"
+        self.assertRaises(ValueError, Portfolio().loadjson, data)
+        self.assertRaises(ValueError, Portfolio(3, [0.01] * 3, [1.0] * 3, [0] * 3, obligor=[1, 2]).preprocess_portfolio)
+
+    def test_net_obligors_pd_rules(self):
+        P = Portfolio(3, [0.01, 0.03, 0.05], [10.0, 30.0, 5.0], [0, 0, 1], obligor=[7, 7, 8])
+        self.assertRaises(ValueError, P.net_obligors)
+        self.assertEqual(P.net_obligors(pd_rule='max').rating, [0.03, 0.05])
+        self.assertAlmostEqual(P.net_obligors(pd_rule='weighted').rating[0], 0.025, places=ACCURATE_DIGITS)
+        P.factor = [0, 1, 1]
+        self.assertRaises(ValueError, P.net_obligors, pd_rule='max')
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_accuracy(self):
+        rng = np.random.default_rng(0)
+        values = np.concatenate([rng.lognormal(2, 2, 20000), -rng.exponential(1, 100), np.zeros(50)])
+        sketch = QuantileSketch(accuracy=1e-3)
+        for batch in np.array_split(values, 7):
+            sketch.update(batch)
+        ordered = np.sort(values)
+        for alpha in [0.001, 0.5, 0.9, 0.99, 0.999]:
+            expected = ordered[int(np.ceil(alpha * len(values))) - 1]
+            self.assertLessEqual(abs(sketch.quantile(alpha) - expected), 1e-3 * abs(expected))
+        # memory does not grow with the number of values
+        size = sketch.size()
+        sketch.update(values)
+        self.assertEqual(sketch.size(), size)
+
+    def test_merge(self):
+        values = np.arange(1.0, 1001.0)
+        first, second = QuantileSketch(), QuantileSketch()
+        first.update(values[:300])
+        second.update(values[300:], np.ones(700))
+        first.merge(second)
+        self.assertEqual(first.count, 1000)
+        self.assertEqual(first.quantile(0.95), 950.0)
+        self.assertRaises(ValueError, first.merge, QuantileSketch(accuracy=0.1))
+
 
 if __name__ == "__main__":
     unittest.main()
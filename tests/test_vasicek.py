@@ -0,0 +1,211 @@
+# encoding: utf-8
+
+# (c) 2017-2024 Open Risk, all rights reserved
+#
+# portfolioAnalytics is licensed under the Apache 2.0 license a copy of which is included
+# in the source distribution of portfolioAnalytics. This is notwithstanding any licenses of
+# third-party software included in this distribution. You may not use this file except in
+# compliance with the License.
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from portfolioAnalytics import settings
+from portfolioAnalytics import vasicek as va
+
+ACCURATE_DIGITS = 7
+
+
+class TestVasicekBase(unittest.TestCase):
+    '''
+    Finite pool Vasicek distribution
+    '''
+
+    def test_vasicek_base(self):
+        self.assertAlmostEqual(va.vasicek_base(10, 3, 0.1, 0.2), 0.0676198881191664, places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(va.vasicek_base(1000, 10, 0.005, 0.24), 0.01458315209650541, places=ACCURATE_DIGITS)
+
+    def test_vasicek_base_normalization(self):
+        total = sum(va.vasicek_base(20, k, 0.05, 0.3) for k in range(21))
+        self.assertAlmostEqual(total, 1.0, places=ACCURATE_DIGITS)
+
+    def test_vasicek_base_pmf(self):
+        pmf = va.vasicek_base_pmf(1000, 0.005, 0.24)
+        self.assertEqual(len(pmf), 1001)
+        self.assertAlmostEqual(pmf[10], va.vasicek_base(1000, 10, 0.005, 0.24), places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(pmf.sum(), 1.0, places=ACCURATE_DIGITS)
+
+    def test_vasicek_base_pmf_large_pool(self):
+        pmf = va.vasicek_base_pmf(20000, 0.01, 0.12)
+        self.assertAlmostEqual(pmf.sum(), 1.0, places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(pmf.dot(range(20001)) / 20000, 0.01, places=ACCURATE_DIGITS)
+
+    def test_vasicek_base_quantile(self):
+        pmf = va.vasicek_base_pmf(100, 0.02, 0.2)
+        quantile = va.vasicek_base_quantile(0.99, 100, 0.02, 0.2)
+        self.assertLess(pmf[:quantile].sum(), 0.99)
+        self.assertGreaterEqual(pmf[:quantile + 1].sum(), 0.99)
+
+    def test_vasicek_base_es(self):
+        pmf = va.vasicek_base_pmf(100, 0.02, 0.2)
+        quantile = va.vasicek_base_quantile(0.99, 100, 0.02, 0.2)
+        tail = pmf[quantile + 1:].dot(range(quantile + 1, 101)) + quantile * (pmf[:quantile + 1].sum() - 0.99)
+        self.assertAlmostEqual(va.vasicek_base_es(0.99, 100, 0.02, 0.2), tail / 0.01, places=5)
+
+    def test_vasicek_base_ul(self):
+        self.assertAlmostEqual(va.vasicek_base_ul(10, 0.1, 0.2), 1.2440510245731604, places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(va.vasicek_base_ul(1000, 0.003, 0.12), 4.326893112225535, places=ACCURATE_DIGITS)
+
+
+class TestVasicekLimit(unittest.TestCase):
+    '''
+    Large pool limit of the Vasicek distribution
+    '''
+
+    def test_vasicek_lim_ul(self):
+        self.assertAlmostEqual(va.vasicek_lim_ul(0.1, 0.2), 0.08483074336200487, places=ACCURATE_DIGITS)
+        self.assertAlmostEqual(va.vasicek_lim_ul(0.003, 0.12), 0.003968217579138038, places=ACCURATE_DIGITS)
+
+    def test_broadcasting(self):
+        p = np.array([0.001, 0.01, 0.1])[:, np.newaxis]
+        rho = np.array([0.12, 0.24])
+        alpha = np.array([0.99, 0.999])[:, np.newaxis, np.newaxis]
+        quantiles = va.vasicek_lim_q(alpha, p, rho)
+        volatilities = va.vasicek_lim_ul(p, rho)
+        cumulative = va.vasicek_lim(0.05, p, rho)
+        self.assertEqual(quantiles.shape, (2, 3, 2))
+        self.assertEqual(volatilities.shape, (3, 2))
+        self.assertEqual(cumulative.shape, (3, 2))
+        for i in range(3):
+            for j in range(2):
+                self.assertAlmostEqual(quantiles[1, i, j], va.vasicek_lim_q(0.999, p[i, 0], rho[j]), places=ACCURATE_DIGITS)
+                self.assertAlmostEqual(volatilities[i, j], va.vasicek_lim_ul(p[i, 0], rho[j]), places=ACCURATE_DIGITS)
+                self.assertAlmostEqual(cumulative[i, j], va.vasicek_lim(0.05, p[i, 0], rho[j]), places=ACCURATE_DIGITS)
+
+    def test_analytic_ul(self):
+        # high precision reference values at extreme PD
+        p = np.array([1e-7, 1e-6])
+        rho = np.array([0.05, 0.12])
+        expected = np.array([1.726294634224142919e-7, 3.6089710700968127532e-6])
+        self.assertTrue(np.allclose(va.vasicek_lim_ul(p, rho, analytic=True), expected, rtol=1e-12, atol=0))
+        base = np.sqrt(100 * p * (1 - p) + 100 * 99 * expected ** 2)
+        self.assertTrue(np.allclose(va.vasicek_base_ul(100, p, rho, analytic=True), base, rtol=1e-12, atol=0))
+
+    def test_greeks(self):
+        p = np.array([0.001, 0.02, 0.2])
+        rho = np.array([0.05, 0.15, 0.4])
+        h = 1e-6
+        functions = [(lambda p, rho: va.vasicek_lim_q(0.999, p, rho), lambda p, rho: va.vasicek_lim_q_greeks(0.999, p, rho)),
+                     (va.vasicek_lim_ul, va.vasicek_lim_ul_greeks),
+                     (lambda p, rho: va.vasicek_base_ul(50, p, rho), lambda p, rho: va.vasicek_base_ul_greeks(50, p, rho))]
+        for function, greeks in functions:
+            value, d_p, d_rho = greeks(p, rho)
+            self.assertTrue(np.allclose(value, function(p, rho)))
+            self.assertTrue(np.allclose(d_p, (function(p + h, rho) - function(p - h, rho)) / (2 * h), rtol=1e-6))
+            self.assertTrue(np.allclose(d_rho, (function(p, rho + h) - function(p, rho - h)) / (2 * h), rtol=1e-6))
+
+    def test_integration_methods(self):
+        default = va.vasicek_lim_ul(0.01, 0.5)
+        method = settings.INTEGRATION_METHOD
+        try:
+            for settings.INTEGRATION_METHOD in ['Gauss-Hermite', 'Gauss-Kronrod']:
+                self.assertAlmostEqual(va.vasicek_lim_ul(0.01, 0.5), default, places=10)
+        finally:
+            settings.INTEGRATION_METHOD = method
+
+    def test_integration_error(self):
+        integrand = lambda z: np.square(va.conditional_pd(z, 0.1, 0.2))
+        reference = va.factor_quadrature(integrand)
+        for method in ['Riemann', 'Gauss-Hermite', 'Gauss-Kronrod']:
+            integral, error, evaluations = va.factor_quadrature(integrand, method=method, tolerance=1e-10, full_output=True)
+            self.assertLess(error, 1e-10)
+            self.assertAlmostEqual(integral, reference, places=10)
+        self.assertRaises(ValueError, va.factor_quadrature, integrand, method='Simpson')
+
+    def test_integration_error_bound(self):
+        integrand = lambda z: np.square(va.conditional_pd(z, 0.1, 0.2))
+        reference = va.factor_quadrature(integrand, method='Gauss-Kronrod', tolerance=1e-11)
+        scale = settings.SCALE
+        try:
+            settings.SCALE = 4.0
+            integral, error, evaluations = va.factor_quadrature(integrand, full_output=True)
+        finally:
+            settings.SCALE = scale
+        self.assertGreaterEqual(error, abs(integral - reference))
+        with self.assertWarns(RuntimeWarning):
+            va.factor_quadrature(lambda z: va.conditional_pd(z, 0.01, 0.99), method='Gauss-Hermite', tolerance=1e-10)
+        levels = settings.MAX_KRONROD_LEVELS
+        try:
+            settings.MAX_KRONROD_LEVELS = 1
+            with self.assertWarns(RuntimeWarning):
+                va.factor_quadrature(lambda z: va.conditional_pd(z, 0.01, 0.99), method='Gauss-Kronrod', tolerance=1e-12)
+            settings.MAX_KRONROD_LEVELS = levels
+            settings.SCALE = 4.0
+            with self.assertWarns(RuntimeWarning):
+                va.factor_quadrature(integrand, method='Gauss-Kronrod', tolerance=1e-10)
+        finally:
+            settings.MAX_KRONROD_LEVELS = levels
+            settings.SCALE = scale
+
+    def test_grid_settings(self):
+        default = va.vasicek_lim_ul(0.1, 0.2)
+        grid_points = settings.GRID_POINTS
+        try:
+            settings.GRID_POINTS = 11
+            coarse = va.vasicek_lim_ul(0.1, 0.2)
+        finally:
+            settings.GRID_POINTS = grid_points
+        self.assertNotAlmostEqual(default, coarse, places=ACCURATE_DIGITS)
+        self.assertEqual(default, va.vasicek_lim_ul(0.1, 0.2))
+
+
+class TestVasicekCache(unittest.TestCase):
+    '''
+    Memoization of Vasicek functions
+    '''
+
+    def tearDown(self):
+        va.cache_disable()
+
+    def test_cache(self):
+        va.cache_enable(maxsize=2)
+        value = va.vasicek_lim_ul(0.1, 0.2)
+        self.assertEqual(va.vasicek_lim_ul(0.1, 0.2), value)
+        self.assertEqual(va.cache_info(), va.CacheInfo(1, 1, 2, 1))
+        va.vasicek_base_ul(10, 0.1, 0.2)
+        va.vasicek_base_ul(20, 0.1, 0.2)
+        self.assertEqual(va.cache_info().currsize, 2)
+        va.cache_clear()
+        self.assertEqual(va.cache_info(), va.CacheInfo(0, 0, 2, 0))
+
+    def test_cache_settings(self):
+        va.cache_enable()
+        default = va.vasicek_lim_ul(0.1, 0.2)
+        grid_points = settings.GRID_POINTS
+        try:
+            settings.GRID_POINTS = 11
+            coarse = va.vasicek_lim_ul(0.1, 0.2)
+        finally:
+            settings.GRID_POINTS = grid_points
+        self.assertNotEqual(default, coarse)
+        self.assertEqual(va.cache_info().misses, 2)
+        # the analytic mode depends on the bivariate normal method
+        accurate = va.vasicek_lim_ul(1e-6, 0.12, analytic=True)
+        method = settings.BIVARIATE_NORMAL_METHOD
+        try:
+            settings.BIVARIATE_NORMAL_METHOD = 'Drezner'
+            drezner = va.vasicek_lim_ul(1e-6, 0.12, analytic=True)
+        finally:
+            settings.BIVARIATE_NORMAL_METHOD = method
+        self.assertNotEqual(accurate, drezner)
+        self.assertEqual(va.cache_info().misses, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()